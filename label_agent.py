@@ -1,5 +1,10 @@
 import sys
 import os
+import hashlib
+import json
+import re
+import shutil
+import threading
 import yaml
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -151,10 +156,392 @@ def load_template():
 
     return data
 
+# Versions du modèle : chaque projet retient la version (hash) du modèle qui a
+# généré sa checklist ; une copie de chaque version est gardée dans
+# PROJECTS_DIR/_templates/ pour pouvoir calculer les différences plus tard.
+TEMPLATES_DIRNAME = "_templates"
+
+# Projets créés avant les versions de modèle (pas de `template_version`) :
+# version "0", copie livrée du plan_template.yaml de l'époque
+BASELINE_VERSION = "0"
+BASELINE_TEMPLATE_FILE = ROOT / "plan_template_v0.yaml"
+
+
+def step_key(step):
+    """Identifiant stable d'une étape du modèle (champ `id`, sinon J+offset)."""
+    return str(step.get("id") or f"j{step.get('day_offset')}")
+
+
+def template_version(template):
+    """Hash court du plan (indépendant de la mise en forme du YAML)."""
+    payload = json.dumps(template.get("release_plan", []), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def save_template_snapshot(template):
+    """Enregistre une copie de cette version du modèle. Retourne la version."""
+    version = template_version(template)
+    path = PROJECTS_DIR / TEMPLATES_DIRNAME / f"{version}.yaml"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            yaml.safe_dump({"release_plan": template.get("release_plan", [])}, f, allow_unicode=True)
+        os.replace(tmp, path)
+    return version
+
+
+def load_template_snapshot(version):
+    """
+    Version enregistrée du modèle, ou None si inconnue. La version "0" est
+    copiée dans PROJECTS_DIR/_templates/ à la première lecture.
+    """
+    if not version:
+        return None
+    path = PROJECTS_DIR / TEMPLATES_DIRNAME / f"{version}.yaml"
+    if version == BASELINE_VERSION and not path.exists():
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+            shutil.copyfile(BASELINE_TEMPLATE_FILE, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError):
+        return None
+    if not isinstance(data.get("release_plan"), list):
+        return None
+    return data
+
+
+# -------------------------------------------------------------------
+# Checklist
+# -------------------------------------------------------------------
+
+# `### Titre <!-- id -->` : l'id de l'étape suit la section même si on la renomme
+_HEADING_RE = re.compile(r"^###\s+(.*?)\s*(?:<!--\s*(\S+)\s*-->)?\s*$")
+
+
+def render_checklist(sections):
+    """Texte de checklist.md à partir de [(id, titre, tâches), ...]."""
+    lines = ["# Checklist globale\n"]
+    for sid, title, tasks in sections:
+        lines.append(f"### {title} <!-- {sid} -->" if sid else f"### {title}")
+        for t in tasks:
+            lines.append(f"- [{'x' if t['done'] else ' '}] {t['text']}")
+    return "\n".join(lines)
+
+
+# -------------------------------------------------------------------
+# Catalogue de projets
+# -------------------------------------------------------------------
+
+_catalog_lock = threading.Lock()
+_catalog_generation = 0
+_catalog_listeners = []
+
+
+def on_catalog_change(callback):
+    """Enregistre callback(slug) appelé à chaque modification (slug None : plusieurs projets)."""
+    _catalog_listeners.append(callback)
+
+
+def touch_catalog(slug=None):
+    """A appeler après toute modification d'un projet (invalide les caches dérivés)."""
+    global _catalog_generation
+    with _catalog_lock:
+        _catalog_generation += 1
+    for callback in list(_catalog_listeners):
+        callback(slug)
+
+
+def catalog_version():
+    """Compteur de modifications du catalogue depuis le lancement du process."""
+    return _catalog_generation
+
+
+def iter_project_dirs():
+    """
+    Dossiers des projets actifs (ceux qui ont un project.yaml),
+    à plat et dans les sous-dossiers de _shards/.
+    """
+    if not PROJECTS_DIR.exists():
+        return
+    for p in PROJECTS_DIR.iterdir():
+        if p.is_dir() and (p / "project.yaml").exists():
+            yield p
+
+    shards_root = PROJECTS_DIR / SHARDS_DIRNAME
+    if shards_root.is_dir():
+        for shard in shards_root.iterdir():
+            if not shard.is_dir():
+                continue
+            for p in shard.iterdir():
+                if p.is_dir() and (p / "project.yaml").exists():
+                    yield p
+
+
+# -------------------------------------------------------------------
+# Organisation des dossiers (à plat ou répartis en sous-dossiers)
+# -------------------------------------------------------------------
+
+# flat   : PROJECTS_DIR/<slug>
+# hash   : PROJECTS_DIR/_shards/<2 premiers hex du sha1 du slug>/<slug>
+# year   : PROJECTS_DIR/_shards/<année de sortie>/<slug>
+# artist : PROJECTS_DIR/_shards/<artiste>/<slug>
+LAYOUTS = ("flat", "hash", "year", "artist")
+LAYOUT_FILE = "_layout.json"
+SHARDS_DIRNAME = "_shards"
+
+_layout_lock = threading.RLock()
+_layout_cache = {"key": None, "data": None}
+
+
+def _layout_path():
+    return PROJECTS_DIR / LAYOUT_FILE
+
+
+def load_layout():
+    """
+    {"layout": ..., "paths": {slug: chemin relatif}, "moving": {slug: chemin relatif}}
+    depuis _layout.json.
+    `paths` n'est utile que pour year / artist (hash se recalcule depuis le slug).
+    `moving` : ancien emplacement des projets du lot en cours de migration.
+    """
+    path = _layout_path()
+    try:
+        st = path.stat()
+        key = (str(path), st.st_size, st.st_mtime_ns)
+    except OSError:
+        key = (str(path), None)
+
+    with _layout_lock:
+        if _layout_cache["key"] != key:
+            data = {}
+            if key[1] is not None:
+                try:
+                    data = json.loads(path.read_text(encoding="utf-8"))
+                except ValueError:
+                    data = {}
+            if not isinstance(data, dict) or data.get("layout") not in LAYOUTS:
+                data = {"layout": "flat", "paths": {}}
+            data.setdefault("paths", {})
+            data.setdefault("moving", {})
+            _layout_cache["key"] = key
+            _layout_cache["data"] = data
+        return _layout_cache["data"]
+
+
+def save_layout(data):
+    path = _layout_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(LAYOUT_FILE + ".tmp")
+    with _layout_lock:
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        st = path.stat()
+        _layout_cache["key"] = (str(path), st.st_size, st.st_mtime_ns)
+        _layout_cache["data"] = data
+
+
+def shard_key(slug, layout, project=None):
+    project = project or {}
+    if layout == "hash":
+        return hashlib.sha1(slug.encode("utf-8")).hexdigest()[:2]
+    if layout == "year":
+        return str(project.get("release_date") or "")[:4] or "sans-date"
+    if layout == "artist":
+        return slugify(str(project.get("artist") or "")) or "sans-artiste"
+    return None
+
+
+def layout_target(slug, layout, project=None):
+    """Emplacement d'un projet dans l'organisation `layout`."""
+    key = shard_key(slug, layout, project)
+    if key is None:
+        return PROJECTS_DIR / slug
+    return PROJECTS_DIR / SHARDS_DIRNAME / key / slug
+
+
+def project_dir(slug):
+    """
+    Résout le dossier d'un projet quelle que soit l'organisation.
+    Pendant une migration, un projet pas encore déplacé est trouvé à son
+    ancien emplacement (`moving`, ou à plat).
+    Si le projet n'existe pas, retourne le chemin à plat.
+    """
+    layout = load_layout()
+    candidates = []
+    for rel in (layout["paths"].get(slug), layout["moving"].get(slug)):
+        if rel:
+            candidates.append(PROJECTS_DIR / rel)
+    candidates.append(layout_target(slug, "hash"))
+    candidates.append(PROJECTS_DIR / slug)
+
+    for path in candidates:
+        if (path / "project.yaml").exists():
+            return path
+    return PROJECTS_DIR / slug
+
+
+def new_project_dir(slug, project):
+    """Dossier d'un nouveau projet selon l'organisation courante (enregistré dans _layout.json)."""
+    existing = project_dir(slug)
+    if (existing / "project.yaml").exists():
+        return existing
+
+    with _layout_lock:
+        layout = load_layout()
+        path = layout_target(slug, layout["layout"], project)
+        if layout["layout"] in ("year", "artist"):
+            data = dict(layout, paths=dict(layout["paths"]))
+            data["paths"][slug] = path.relative_to(PROJECTS_DIR).as_posix()
+            save_layout(data)
+    return path
+
+
+def forget_project_dir(slug):
+    with _layout_lock:
+        layout = load_layout()
+        if slug in layout["paths"]:
+            data = dict(layout, paths=dict(layout["paths"]))
+            del data["paths"][slug]
+            save_layout(data)
+
+
+def migrate_layout(target, batch_size=100, log=print):
+    """
+    Déplace tous les projets vers l'organisation `target`, sans arrêter l'app.
+
+    La nouvelle organisation est enregistrée d'abord (les nouveaux projets y
+    vont directement). Pour chaque lot, _layout.json reçoit les nouveaux
+    chemins et garde les anciens dans `moving` pendant les renommages, retirés
+    ensuite : à tout moment project_dir() trouve le projet, à son ancien ou à
+    son nouvel emplacement, sans retomber sur le chemin à plat.
+    """
+    import label_journal
+
+    if target not in LAYOUTS:
+        raise ValueError(f"Organisation inconnue : {target}")
+
+    with _layout_lock:
+        layout = load_layout()
+        data = dict(layout, layout=target, paths=dict(layout["paths"]))
+        save_layout(data)
+
+    moves = []
+    for path in list(iter_project_dirs()):
+        project = label_journal.project_meta(path)
+        dest = layout_target(path.name, target, project)
+        if dest != path:
+            moves.append((path, dest))
+
+    moved = 0
+    for i in range(0, len(moves), batch_size):
+        batch = moves[i:i + batch_size]
+
+        with _layout_lock:
+            layout = load_layout()
+            data = dict(layout, paths=dict(layout["paths"]), moving=dict(layout["moving"]))
+            for src, dest in batch:
+                data["moving"][src.name] = src.relative_to(PROJECTS_DIR).as_posix()
+                if target in ("year", "artist"):
+                    data["paths"][src.name] = dest.relative_to(PROJECTS_DIR).as_posix()
+                else:
+                    data["paths"].pop(src.name, None)
+            save_layout(data)
+
+        for src, dest in batch:
+            if dest.exists():
+                log(f" ! déjà présent, ignoré : {dest}")
+                continue
+            label_journal.compact(src)
+            label_journal.forget(src)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, dest)
+            moved += 1
+
+        with _layout_lock:
+            layout = load_layout()
+            data = dict(layout, moving=dict(layout["moving"]))
+            for src, _dest in batch:
+                data["moving"].pop(src.name, None)
+            save_layout(data)
+
+    # Sous-dossiers devenus vides
+    shards_root = PROJECTS_DIR / SHARDS_DIRNAME
+    if shards_root.is_dir():
+        for shard in shards_root.iterdir():
+            if shard.is_dir() and not any(shard.iterdir()):
+                shard.rmdir()
+        if not any(shards_root.iterdir()):
+            shards_root.rmdir()
+
+    touch_catalog()
+    log(f"{moved} projet(s) déplacé(s) vers l'organisation « {target} ».")
+    return moved
+
+
+def iter_checklist_steps(text: str):
+    """
+    Découpe le contenu de checklist.md en sections `### Titre <!-- id -->`.
+    Yield (id ou None, titre, [{"text": ..., "done": bool}, ...]).
+    """
+    sid = None
+    title = None
+    tasks = []
+    for line in text.splitlines():
+        stripped = line.strip()
+
+        if stripped.startswith("### "):
+            if title is not None:
+                yield sid, title, tasks
+            m = _HEADING_RE.match(stripped)
+            title, sid = m.group(1), m.group(2)
+            tasks = []
+            continue
+
+        if stripped.startswith("- [ ]") or stripped.startswith("- [x]"):
+            if title is None:
+                continue
+            tasks.append({"text": stripped[5:].strip(), "done": stripped.startswith("- [x]")})
+
+    if title is not None:
+        yield sid, title, tasks
+
+
+def iter_checklist_sections(text: str):
+    """
+    Découpe le contenu de checklist.md en sections `### Titre`.
+    Yield (titre, [{"text": ..., "done": bool}, ...]).
+    """
+    for _sid, title, tasks in iter_checklist_steps(text):
+        yield title, tasks
+
+
 # -------------------------------------------------------------------
 # Création de projet
 # -------------------------------------------------------------------
 
+def duplicate_tracks(tracks):
+    """
+    Noms de pistes en double (comparés en slug). Deux pistes de même nom
+    donneraient des tâches [per_track] identiques : cocher l'une cocherait
+    toujours la première.
+    """
+    seen = set()
+    duplicates = []
+    for name in tracks:
+        key = slugify(str(name))
+        if key in seen and name not in duplicates:
+            duplicates.append(name)
+        seen.add(key)
+    return duplicates
+
+
 def create_project_structure(
     slug,
     title,
@@ -165,12 +552,20 @@ def create_project_structure(
     use_spotify_canvas=False,
     use_paid_ads=False,
     release_type="Single",
+    tracks=None,
 ):
-    """Crée la structure d'un nouveau projet à partir du modèle fixe"""
-    project_path = PROJECTS_DIR / slug
+    """Crée la structure d'un nouveau projet à partir du modèle de son type de sortie"""
+    import label_plans
+
+    duplicates = duplicate_tracks(tracks or [])
+    if duplicates:
+        raise ValueError(f"Pistes en double : {', '.join(duplicates)}")
+
+    project_path = new_project_dir(
+        slug, {"artist": artist, "release_date": release_date.strftime("%Y-%m-%d")}
+    )
     project_path.mkdir(parents=True, exist_ok=True)
 
-    template = load_template()
     genre_cfg = get_genre_config(genre)
 
     lufs_range = genre_cfg["master_lufs"]
@@ -193,6 +588,11 @@ def create_project_structure(
         "use_paid_ads": bool(use_paid_ads),
         "release_type": release_type,
     }
+    if tracks:
+        project_yaml["tracks"] = list(tracks)
+
+    plan = label_plans.plan_for(project_yaml)
+    project_yaml["template_version"] = save_template_snapshot(plan["template"])
 
     with open(project_path / "project.yaml", "w", encoding="utf-8") as f:
         yaml.dump(project_yaml, f, allow_unicode=True)
@@ -201,29 +601,9 @@ def create_project_structure(
     # -------------------------
     # checklist.md
     # -------------------------
-    checklist_lines = ["# Checklist globale\n"]
-    for step in template["release_plan"]:
-        checklist_lines.append(f"### {step['title']}")
-
-        for raw_task in step["tasks"]:
-            task = raw_task
-
-            if isinstance(raw_task, str):
-                if raw_task.startswith("[opt_spotify_canvas]"):
-                    if not use_spotify_canvas:
-                        continue
-                    task = raw_task.replace("[opt_spotify_canvas]", "").strip()
-                elif raw_task.startswith("[opt_paid_ads]"):
-                    if not use_paid_ads:
-                        continue
-                    task = raw_task.replace("[opt_paid_ads]", "").strip()
-
-            if "Masteriser le titre" in task and lufs_range:
-                task = f"Masteriser le titre ({lufs_range}, TP ≤ -1 dBTP)"
-
-            checklist_lines.append(f"- [ ] {task}")
-
-    (project_path / "checklist.md").write_text("\n".join(checklist_lines), encoding="utf-8")
+    checklist = render_checklist(label_plans.render_sections(plan, project_yaml))
+    (project_path / "checklist.md").write_text(checklist, encoding="utf-8")
+    touch_catalog(slug)
 
     print(f"Projet créé : {project_path}")
     print("→ plan.md, checklist.md et project.yaml générés à partir du modèle.")
@@ -231,16 +611,14 @@ def create_project_structure(
 
 
 # -------------------------------------------------------------------
-# CLI
+# Deadlines / description libre (CLI et démon)
 # -------------------------------------------------------------------
 
-def cmd_new(args):
-    """Mode CLI texte libre (tu peux garder la commande `python label_agent.py new "...")`"""
-    user_input = " ".join(args)
-    if not user_input.strip():
-        print("⚠️  Merci de décrire le projet, ex : Je veux sortir Coffee Lofi, un morceau chill début décembre")
-        return
-
+def parse_project_description(user_input: str):
+    """
+    Texte libre -> (slug, titre, date de sortie, genre),
+    ex : "Je veux sortir Coffee Lofi, un morceau chill début décembre".
+    """
     title_part = user_input.strip().split(",")[0]
     title = title_part.replace("Je veux sortir", "").strip()
     if not title:
@@ -276,48 +654,274 @@ def cmd_new(args):
             except ValueError:
                 pass
 
-    create_project_structure(slug, title, release_date, genre, release_type)
+    return slug, title, release_date, genre
+
+
+def next_deadline(project, plan, checklist="", today=None):
+    """
+    Prochaine étape à venir d'un projet (plan compilé : label_plans) :
+      {"step_id", "title", "day_offset", "date", "days_left",
+       "tasks": [{"text", "done"}, ...]}
+    ou None (plus d'étape à venir, ou date de sortie invalide).
+    Les tâches viennent de la checklist du projet, sinon du modèle.
+    """
+    try:
+        release_date = datetime.strptime(project.get("release_date") or "", "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+    today = today or datetime.now().date()
+    today_offset = (today - release_date).days
+
+    step = next((s for s in plan["by_offset"] if s["day_offset"] >= today_offset), None)
+    if step is None:
+        return None
+
+    tasks = None
+    for sid, title, section_tasks in iter_checklist_steps(checklist):
+        if sid == step["id"] or (sid is None and title == step["title"]):
+            tasks = section_tasks
+            break
+    if tasks is None:
+        import label_plans
+
+        tasks = next(
+            [dict(t) for t in section_tasks]
+            for sid, _title, section_tasks in label_plans.render_sections(plan, project)
+            if sid == step["id"]
+        )
+
+    return {
+        "step_id": step["id"],
+        "title": step["title"],
+        "day_offset": step["day_offset"],
+        "date": (release_date + timedelta(days=step["day_offset"])).isoformat(),
+        "days_left": step["day_offset"] - today_offset,
+        "tasks": [{"text": t["text"], "done": t["done"]} for t in tasks],
+    }
+
+
+# -------------------------------------------------------------------
+# CLI
+# -------------------------------------------------------------------
+
+def cmd_new(args):
+    """Mode CLI texte libre (tu peux garder la commande `python label_agent.py new "...")`"""
+    user_input = " ".join(args)
+    if not user_input.strip():
+        print("⚠️  Merci de décrire le projet, ex : Je veux sortir Coffee Lofi, un morceau chill début décembre")
+        return
+
+    # démon lancé (label_agent.py serve) : modèles déjà compilés
+    import label_daemon
+
+    try:
+        result = label_daemon.request("new", base=PROJECTS_DIR, description=user_input)
+    except label_daemon.DaemonUnavailable:
+        pass
+    except label_daemon.DaemonError as e:
+        print(f"⚠️  {e}")
+        return
+    else:
+        print(f"Projet créé : {result['path']}")
+        return
+
+    slug, title, release_date, genre = parse_project_description(user_input)
+    create_project_structure(slug, title, release_date, genre)
 
 
 def cmd_deadline(slug):
     """Affiche la prochaine deadline à venir dans le terminal"""
-    project_path = PROJECTS_DIR / slug
-    yaml_file = project_path / "project.yaml"
-    plan_file = TEMPLATE_FILE
+    import label_daemon
+    import label_journal
+    import label_plans
 
-    if not yaml_file.exists():
-        print("Projet introuvable.")
+    # démon lancé (label_agent.py serve) : réponse depuis ses caches,
+    # sinon calcul dans ce process
+    try:
+        entry = label_daemon.request("deadline", base=PROJECTS_DIR, slug=slug)
+    except (label_daemon.DaemonError, OSError, ValueError):
+        entry = None
+
+    if entry is not None:
+        if entry.get("error"):
+            print("Projet introuvable.")
+            return
+        deadline = entry["deadline"]
+    else:
+        project_path = project_dir(slug)
+        if not (project_path / "project.yaml").exists():
+            print("Projet introuvable.")
+            return
+
+        project = label_journal.project_meta(project_path)
+        deadline = next_deadline(
+            project, label_plans.project_plan(project), label_journal.checklist_text(project_path)
+        )
+
+    if not deadline:
+        print("🎉 Toutes les étapes sont complétées !")
         return
 
-    project = yaml.safe_load(yaml_file.read_text(encoding="utf-8"))
-    plan = yaml.safe_load(plan_file.read_text(encoding="utf-8"))
+    print(f"\n🗓️ Prochaine deadline dans {deadline['days_left']} jours ({deadline['title']}) :\n")
+    for t in deadline["tasks"]:
+        print(f" - [{'x' if t['done'] else ' '}] {t['text']}")
+    print()
 
-    release_date = datetime.strptime(project["release_date"], "%Y-%m-%d")
-    today = datetime.now()
-    today_offset = (today - release_date).days
 
-    steps = sorted(plan["release_plan"], key=lambda s: s["day_offset"])
-    next_step = None
-    for step in steps:
-        if step["day_offset"] >= today_offset:
-            next_step = step
-            break
+def cmd_export(args):
+    """Exporte toutes les deadlines en ICS ou CSV (fichier ou sortie standard)"""
+    import label_export
 
-    if not next_step:
-        print("🎉 Toutes les étapes sont complétées !")
+    fmt = args[0].lower() if args else "ics"
+    if fmt not in ("ics", "csv"):
+        print(f"Format inconnu : {fmt} (ics ou csv)")
         return
 
-    days_left = next_step["day_offset"] - today_offset
-    print(f"\n🗓️ Prochaine deadline dans {days_left} jours ({next_step['title']}) :\n")
-    for t in next_step["tasks"]:
-        print(f" - [ ] {t}")
+    chunks = label_export.iter_ics() if fmt == "ics" else label_export.iter_csv()
+
+    if len(args) > 1:
+        # newline="" : les fins de ligne (CRLF pour ICS / CSV) sont déjà dans le flux
+        with open(args[1], "w", encoding="utf-8", newline="") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        print(f"Export {fmt.upper()} écrit : {args[1]}")
+    else:
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+
+
+def cmd_archive(args):
+    """Archive (compresse) les projets sortis depuis plus de N jours"""
+    import label_archive
+
+    days = label_archive.DEFAULT_ARCHIVE_AFTER_DAYS
+    if args:
+        try:
+            days = int(args[0])
+        except ValueError:
+            print("Le nombre de jours doit être un entier.")
+            return
+
+    archived = label_archive.archive_released(days)
+    if not archived:
+        print(f"Aucun projet sorti depuis plus de {days} jours.")
+        return
+    for slug in archived:
+        print(f" - archivé : {slug}")
+    print(f"{len(archived)} projet(s) archivé(s) dans {label_archive.archive_dir()}")
+
+
+def cmd_layout(args):
+    """Change l'organisation des dossiers de projets (migration en place)"""
+    if not args or args[0] not in LAYOUTS:
+        print(f"Organisation actuelle : {load_layout()['layout']}")
+        print(f"Usage : label_agent.py layout <{'|'.join(LAYOUTS)}>")
+        return
+    migrate_layout(args[0])
+
+
+def cmd_loudness(args):
+    """Analyse un master WAV (LUFS intégré, LRA, true-peak), ex : loudness master.wav [slug]"""
+    import label_assets
+    import label_journal
+    import label_loudness
+
+    if not args:
+        print("Il faut préciser le fichier WAV à analyser.")
+        return
+
+    wav_path = Path(args[0])
+    if len(args) > 1:
+        project_path = project_dir(args[1])
+        if not (project_path / "project.yaml").exists():
+            print("Projet introuvable.")
+            return
+        project = label_journal.project_meta(project_path)
+        result = label_loudness.analyze_project_master(project_path, project, wav_path)
+    else:
+        try:
+            result = label_loudness.analyze_wav(wav_path)
+        except (OSError, label_assets.WavError) as e:
+            result = {"error": str(e)}
+
+    if result.get("error"):
+        print(f"Analyse impossible : {result['error']}")
+        return
+
+    print(f"\n🎚️ {wav_path.name} ({result['bits']} bits, {result['sample_rate']} Hz, {result['duration']} s)")
+    print(f" - Loudness intégrée : {result['integrated_lufs']} LUFS")
+    print(f" - Loudness range    : {result['loudness_range']} LU")
+    print(f" - True-peak         : {result['true_peak_dbtp']} dBTP")
+    if result.get("verdict"):
+        print(f" - Cible             : {result['target']}")
+        print(f" → {result['verdict']}")
     print()
 
 
+def cmd_assets(slug):
+    """Vérifie les fichiers de <projet>/assets et coche les tâches correspondantes"""
+    import label_assets
+
+    project_path = project_dir(slug)
+    if not (project_path / "project.yaml").exists():
+        print("Projet introuvable.")
+        return
+
+    results = label_assets.validate_project(project_path, tick=True)
+    if not results:
+        print(f"Aucun fichier dans {project_path / label_assets.ASSETS_DIRNAME}")
+        return
+
+    for r in results:
+        if r["rule"]:
+            print(f" ✓ {r['file']} : {label_assets.ASSET_RULES[r['rule']]['label']}")
+        else:
+            print(f" ⚠ {r['file']} : {', '.join(r['issues'])}")
+
+
+def cmd_gc():
+    """Recompte les références du store de fichiers et supprime les blobs orphelins"""
+    import label_archive
+    import label_store
+
+    archived = [entry.get("assets") or {} for entry in label_archive.load_index().values()]
+    removed = label_store.gc(archived)
+    print(f"{removed} fichier(s) orphelin(s) supprimé(s) de {label_store.store_dir()}")
+
+
+def cmd_migrate(args):
+    """Met les checklists existantes à jour après une modification du modèle"""
+    import label_migrate
+
+    dry_run = "--dry-run" in args
+    diffs, reports = label_migrate.migrate_all(dry_run=dry_run)
+    print(label_migrate.format_report(diffs, reports, dry_run=dry_run))
+
+
+def cmd_serve():
+    """Démon local : garde modèles et index en mémoire (client : label_daemon.py)"""
+    import label_daemon
+
+    try:
+        label_daemon.serve()
+    except label_daemon.DaemonError as e:
+        print(f"⚠️  {e}")
+        sys.exit(1)
+
+
 def main():
     if len(sys.argv) < 2:
         print("Usage : label_agent.py new <description du projet>")
         print("        label_agent.py deadline <slug>")
+        print("        label_agent.py export [ics|csv] [fichier]")
+        print("        label_agent.py archive [jours]")
+        print("        label_agent.py layout <flat|hash|year|artist>")
+        print("        label_agent.py loudness <fichier.wav> [slug]")
+        print("        label_agent.py assets <slug>")
+        print("        label_agent.py gc")
+        print("        label_agent.py migrate [--dry-run]")
+        print("        label_agent.py serve   (client : label_daemon.py)")
         sys.exit(0)
 
     cmd = sys.argv[1]
@@ -330,6 +934,25 @@ def main():
             print("Il faut préciser le slug du projet.")
         else:
             cmd_deadline(args[0])
+    elif cmd == "export":
+        cmd_export(args)
+    elif cmd == "archive":
+        cmd_archive(args)
+    elif cmd == "layout":
+        cmd_layout(args)
+    elif cmd == "loudness":
+        cmd_loudness(args)
+    elif cmd == "gc":
+        cmd_gc()
+    elif cmd == "migrate":
+        cmd_migrate(args)
+    elif cmd == "serve":
+        cmd_serve()
+    elif cmd == "assets":
+        if not args:
+            print("Il faut préciser le slug du projet.")
+        else:
+            cmd_assets(args[0])
     else:
         print(f"Commande inconnue : {cmd}")
 
@@ -0,0 +1,225 @@
+"""
+Archivage des projets sortis depuis longtemps.
+
+Chaque projet archivé est compressé dans `_archive/<slug>.tar.xz` et retiré de
+PROJECTS_DIR : les parcours du catalogue ne voient plus que les projets actifs.
+Un petit index JSON (`_archive/index.json`) garde les infos affichées sur le
+tableau de bord et les événements datés du projet (exports ICS / CSV) ;
+l'archive n'est décompressée que lorsqu'on ouvre le projet.
+"""
+import json
+import os
+import shutil
+import tarfile
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import yaml
+
+import label_agent
+import label_journal
+import label_store
+
+ARCHIVE_DIRNAME = "_archive"
+INDEX_FILE = "index.json"
+
+# Par défaut : projets sortis depuis plus de 90 jours
+DEFAULT_ARCHIVE_AFTER_DAYS = 90
+
+# Champs de project.yaml recopiés dans l'index
+INDEX_FIELDS = ("title", "artist", "label", "genre", "release_date", "release_type")
+
+_lock = threading.RLock()
+_index_cache = {"key": None, "data": {}}
+
+
+def archive_dir() -> Path:
+    return label_agent.PROJECTS_DIR / ARCHIVE_DIRNAME
+
+
+# -------------------------------------------------------------------
+# Index
+# -------------------------------------------------------------------
+
+def load_index() -> dict:
+    """{slug: {infos projet, "archived_at", "file"}} (relu seulement si modifié)."""
+    path = archive_dir() / INDEX_FILE
+    try:
+        st = path.stat()
+    except OSError:
+        return {}
+
+    key = (str(path), st.st_size, st.st_mtime_ns)
+    with _lock:
+        if _index_cache["key"] != key:
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                data = {}
+            _index_cache["key"] = key
+            _index_cache["data"] = data if isinstance(data, dict) else {}
+        return _index_cache["data"]
+
+
+def _save_index(data: dict):
+    path = archive_dir() / INDEX_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(INDEX_FILE + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def is_archived(slug: str) -> bool:
+    return slug in load_index()
+
+
+# -------------------------------------------------------------------
+# Archivage / restauration
+# -------------------------------------------------------------------
+
+def archive_project(project_path: Path) -> bool:
+    """Compresse un projet dans _archive/ puis supprime le dossier actif."""
+    import label_export
+
+    slug = project_path.name
+    with _lock:
+        project = label_journal.project_meta(project_path)
+        events = _serialize_events(label_export.iter_project_events(project_path))
+        label_journal.compact(project_path)
+        label_journal.forget(project_path)
+
+        # fichiers du store : gardés dans _assets/ (références conservées),
+        # recréés par lien au désarchivage
+        manifest = label_store.load_manifest(project_path)
+        stored = {f"{slug}/{rel}" for rel in manifest}
+
+        target_dir = archive_dir()
+        target_dir.mkdir(parents=True, exist_ok=True)
+        archive_name = f"{slug}.tar.xz"
+        tmp = target_dir / (archive_name + ".tmp")
+        with tarfile.open(tmp, "w:xz") as tar:
+            tar.add(project_path, arcname=slug, filter=lambda m: None if m.name in stored else m)
+        os.replace(tmp, target_dir / archive_name)
+
+        index = dict(load_index())
+        entry = {k: project.get(k) for k in INDEX_FIELDS}
+        entry["archived_at"] = datetime.now().isoformat(timespec="seconds")
+        entry["file"] = archive_name
+        entry["assets"] = manifest
+        entry["events"] = events
+        index[slug] = entry
+        _save_index(index)
+
+        shutil.rmtree(project_path)
+        label_agent.forget_project_dir(slug)
+        label_agent.touch_catalog(slug)
+    return True
+
+
+def _serialize_events(events):
+    return [
+        dict(ev, release_date=ev["release_date"].isoformat(), date=ev["date"].isoformat())
+        for ev in events
+    ]
+
+
+def _events_from_archive(slug, entry):
+    """Evénements d'un projet archivé avant que l'index ne les garde."""
+    import label_export
+
+    with tarfile.open(archive_dir() / entry["file"], "r:xz") as tar:
+        texts = {}
+        for name in ("project.yaml", "checklist.md"):
+            member = tar.extractfile(f"{slug}/{name}")
+            texts[name] = member.read().decode("utf-8") if member else ""
+    project = yaml.safe_load(texts["project.yaml"]) or {}
+    if not isinstance(project, dict):
+        project = {}
+    return _serialize_events(label_export.project_events(slug, project, texts["checklist.md"]))
+
+
+def archived_events() -> dict:
+    """
+    {slug: [événements datés]} des projets archivés, dates en ISO.
+    Les entrées d'index plus anciennes sont complétées une fois depuis
+    l'archive (la seule décompression).
+    """
+    with _lock:
+        index = load_index()
+        missing = [slug for slug, entry in index.items() if "events" not in entry]
+        if missing:
+            index = dict(index)
+            for slug in missing:
+                entry = dict(index[slug])
+                try:
+                    entry["events"] = _events_from_archive(slug, entry)
+                except (OSError, KeyError, tarfile.TarError, yaml.YAMLError):
+                    entry["events"] = []
+                index[slug] = entry
+            _save_index(index)
+        return {slug: entry["events"] for slug, entry in index.items()}
+
+
+def archive_released(days: int = DEFAULT_ARCHIVE_AFTER_DAYS):
+    """Archive les projets sortis depuis plus de `days` jours. Retourne les slugs archivés."""
+    limit = datetime.now().date() - timedelta(days=days)
+    archived = []
+    for project_path in list(label_agent.iter_project_dirs()):
+        project = label_journal.project_meta(project_path)
+        try:
+            release_date = datetime.strptime(project.get("release_date") or "", "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        if release_date < limit:
+            archive_project(project_path)
+            archived.append(project_path.name)
+    return archived
+
+
+def restore(slug: str):
+    """
+    Décompresse un projet archivé parmi les projets actifs.
+    Retourne le dossier du projet, ou None s'il n'est pas archivé.
+    """
+    with _lock:
+        index = load_index()
+        entry = index.get(slug)
+        if entry is None:
+            project_path = label_agent.project_dir(slug)
+            return project_path if project_path.exists() else None
+
+        # L'archive contient le dossier <slug>/ : on l'extrait à sa place
+        # dans l'organisation courante (à plat ou _shards/...)
+        project_path = label_agent.new_project_dir(slug, entry)
+        project_path.parent.mkdir(parents=True, exist_ok=True)
+        archive_path = archive_dir() / entry["file"]
+        with tarfile.open(archive_path, "r:xz") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(project_path.parent, filter="data")
+            else:
+                tar.extractall(project_path.parent)
+
+        index = dict(index)
+        del index[slug]
+        _save_index(index)
+        archive_path.unlink()
+        label_store.relink_project(project_path)
+        label_agent.touch_catalog(slug)
+        return project_path
+
+
+def delete_archived(slug: str) -> bool:
+    with _lock:
+        index = dict(load_index())
+        entry = index.pop(slug, None)
+        if entry is None:
+            return False
+        _save_index(index)
+        try:
+            (archive_dir() / entry["file"]).unlink()
+        except OSError:
+            pass
+        label_store.release_manifest(entry.get("assets") or {})
+        label_agent.touch_catalog(slug)
+        return True
@@ -0,0 +1,543 @@
+"""
+Validation des fichiers d'un projet (cover, teaser, visualizer, master)
+par lecture des en-têtes uniquement.
+
+  - PNG  : chunk IHDR (24 premiers octets)
+  - JPEG : segments jusqu'au marqueur SOFn
+  - WAV  : chunks RIFF jusqu'à `data` (format, bits, fréquence)
+  - MP4 / MOV : boîte `moov` (durée dans mvhd, dimensions dans tkhd),
+    les boîtes `mdat` étant sautées par seek
+
+Aucun fichier n'est décodé : même un dossier de plusieurs Go se valide en
+quelques millisecondes. Les résultats sont mis en cache par sha256 du contenu
+(celui du manifeste du store pour les fichiers envoyés via l'app), et les
+tâches correspondantes de la checklist sont cochées.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+
+from slugify import slugify
+
+import label_agent
+import label_journal
+import label_store
+
+ASSETS_DIRNAME = "assets"
+CACHE_FILE = "_asset_cache.json"
+
+# Master du projet, à la racine (envoyé depuis l'onglet Vue d'ensemble)
+MASTER_FILE = "master.wav"
+
+# Nom de piste dans une tâche répétée par piste : « titre »
+_TRACK_RE = re.compile(r"«\s*(.+?)\s*»")
+
+# Chaque règle coche la première tâche de la checklist contenant `task`
+ASSET_RULES = {
+    "cover": {"task": "cover 3000x3000", "label": "Cover 3000x3000"},
+    "teaser": {"task": "teaser vertical (9:16)", "label": "Teaser 9:16"},
+    "visualizer": {"task": "visualizer YouTube 16:9", "label": "Visualizer 16:9"},
+    "master": {"task": "WAV 24 bits", "label": "Master WAV 24 bits"},
+}
+
+COVER_SIZE = 3000
+ASPECT_TOLERANCE = 0.01
+
+_lock = threading.Lock()
+_cache = {"loaded": False, "data": {}, "dirty": False}
+
+# sha256 des fichiers hors store : {chemin: (taille, mtime, sha256)}
+_hashes = {}
+
+
+class AssetError(ValueError):
+    pass
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavError(AssetError):
+    pass
+
+
+# -------------------------------------------------------------------
+# En-tête WAV
+# -------------------------------------------------------------------
+
+def read_wav_info(path: Path):
+    """
+    Lit les chunks RIFF jusqu'à `data` (sans lire les échantillons).
+    Retourne {"format", "channels", "sample_rate", "bits", "block_align",
+              "data_offset", "data_size", "frames", "duration"}.
+    """
+    path = Path(path)
+    file_size = path.stat().st_size
+    info = {}
+
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise WavError("Fichier WAV invalide (en-tête RIFF/WAVE absent)")
+
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            chunk_id, size = struct.unpack("<4sI", chunk)
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(size)
+                if len(fmt) < 16:
+                    raise WavError("Chunk fmt trop court")
+                fmt_tag, channels, rate, _byte_rate, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+                if fmt_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                    # sous-format : 2 premiers octets du GUID
+                    fmt_tag = struct.unpack("<H", fmt[24:26])[0]
+                info.update(
+                    format=fmt_tag,
+                    channels=channels,
+                    sample_rate=rate,
+                    bits=bits,
+                    block_align=block_align,
+                )
+                if size % 2:
+                    f.seek(1, 1)
+            elif chunk_id == b"data":
+                data_offset = f.tell()
+                # taille 0 / 0xFFFFFFFF : fichier en cours d'écriture ou RF64
+                data_size = min(size, file_size - data_offset)
+                info.update(data_offset=data_offset, data_size=data_size)
+                break
+            else:
+                f.seek(size + (size % 2), 1)
+
+    if "format" not in info:
+        raise WavError("Chunk fmt introuvable")
+    if "data_offset" not in info:
+        raise WavError("Chunk data introuvable")
+    if not info["block_align"] or not info["channels"]:
+        raise WavError("Chunk fmt invalide")
+
+    info["frames"] = info["data_size"] // info["block_align"]
+    info["duration"] = info["frames"] / info["sample_rate"] if info["sample_rate"] else 0.0
+    return info
+
+
+# -------------------------------------------------------------------
+# Images
+# -------------------------------------------------------------------
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# SOF0..SOF15 sauf DHT (C4), JPG (C8) et DAC (CC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _probe_png(f):
+    header = f.read(24)
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b"IHDR":
+        raise AssetError("PNG invalide")
+    width, height = struct.unpack(">II", header[16:24])
+    return {"kind": "image", "format": "PNG", "width": width, "height": height}
+
+
+def _probe_jpeg(f):
+    if f.read(2) != b"\xff\xd8":
+        raise AssetError("JPEG invalide")
+    while True:
+        byte = f.read(1)
+        if not byte:
+            break
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            break
+        code = marker[0]
+        if code == 0xD8 or 0xD0 <= code <= 0xD7 or code == 0x01:
+            continue
+        if code in (0xD9, 0xDA):
+            break
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        length = struct.unpack(">H", length_bytes)[0]
+        if code in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                break
+            _precision, height, width = struct.unpack(">BHH", data)
+            return {"kind": "image", "format": "JPEG", "width": width, "height": height}
+        f.seek(length - 2, 1)
+    raise AssetError("JPEG : dimensions introuvables")
+
+
+# -------------------------------------------------------------------
+# Vidéo (MP4 / MOV)
+# -------------------------------------------------------------------
+
+def _iter_boxes(f, start, end):
+    """Yield (type, offset du contenu, taille du contenu) des boîtes entre start et end."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return
+            size = struct.unpack(">Q", large)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            return
+        yield box_type, pos + header_size, size - header_size
+        pos += size
+
+
+def _parse_moov(moov: bytes):
+    """Durée (mvhd) et dimensions de la première piste vidéo (tkhd + hdlr)."""
+    f = io.BytesIO(moov)
+    duration = None
+    video = None
+
+    for box_type, offset, size in _iter_boxes(f, 0, len(moov)):
+        if box_type == b"mvhd":
+            version = moov[offset]
+            if version == 1:
+                timescale, length = struct.unpack(">IQ", moov[offset + 20:offset + 32])
+            else:
+                timescale, length = struct.unpack(">II", moov[offset + 12:offset + 20])
+            if timescale:
+                duration = length / timescale
+
+        elif box_type == b"trak" and video is None:
+            dims = None
+            handler = None
+            for sub_type, sub_offset, sub_size in _iter_boxes(f, offset, offset + size):
+                if sub_type == b"tkhd":
+                    tkhd = moov[sub_offset:sub_offset + sub_size]
+                    # matrice 3x3 (36 octets) puis largeur / hauteur en 16.16
+                    matrix = struct.unpack(">9i", tkhd[-44:-8])
+                    width, height = struct.unpack(">II", tkhd[-8:])
+                    width, height = width >> 16, height >> 16
+                    # rotation de 90° / 270° (vidéos de téléphone) : dimensions inversées
+                    if matrix[0] == 0 and matrix[1] != 0:
+                        width, height = height, width
+                    dims = (width, height)
+                elif sub_type == b"mdia":
+                    for m_type, m_offset, _m_size in _iter_boxes(f, sub_offset, sub_offset + sub_size):
+                        if m_type == b"hdlr":
+                            handler = moov[m_offset + 8:m_offset + 12]
+            if handler == b"vide" and dims:
+                video = dims
+
+    return duration, video
+
+
+def _probe_mp4(f, file_size):
+    for box_type, offset, size in _iter_boxes(f, 0, file_size):
+        if box_type == b"moov":
+            f.seek(offset)
+            duration, video = _parse_moov(f.read(size))
+            if not video:
+                raise AssetError("Vidéo : aucune piste vidéo trouvée")
+            return {
+                "kind": "video",
+                "format": "MP4",
+                "width": video[0],
+                "height": video[1],
+                "duration": round(duration, 2) if duration is not None else None,
+            }
+    raise AssetError("Vidéo : boîte moov introuvable")
+
+
+# -------------------------------------------------------------------
+# Détection du type
+# -------------------------------------------------------------------
+
+def probe(path: Path):
+    """Lit uniquement l'en-tête de `path` et retourne ses caractéristiques."""
+    path = Path(path)
+    file_size = path.stat().st_size
+    with open(path, "rb") as f:
+        magic = f.read(12)
+        f.seek(0)
+        if magic.startswith(PNG_SIGNATURE):
+            return _probe_png(f)
+        if magic.startswith(b"\xff\xd8"):
+            return _probe_jpeg(f)
+        if magic[4:8] == b"ftyp":
+            return _probe_mp4(f, file_size)
+
+    if magic[:4] == b"RIFF" and magic[8:12] == b"WAVE":
+        info = read_wav_info(path)
+        return {
+            "kind": "audio",
+            "format": "WAV",
+            "bits": info["bits"],
+            "sample_rate": info["sample_rate"],
+            "channels": info["channels"],
+            "duration": round(info["duration"], 2),
+        }
+    raise AssetError("Format non reconnu")
+
+
+def sha256_file(path: Path) -> str:
+    """
+    sha256 du contenu d'un fichier déposé hors de l'app (lu par blocs).
+    Recalculé seulement si la taille ou la date de modification changent.
+    """
+    path = Path(path)
+    st = path.stat()
+    known = _hashes.get(str(path))
+    if known and known[:2] == (st.st_size, st.st_mtime_ns):
+        return known[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(label_store.CHUNK_SIZE), b""):
+            h.update(chunk)
+    _hashes[str(path)] = (st.st_size, st.st_mtime_ns, h.hexdigest())
+    return h.hexdigest()
+
+
+# -------------------------------------------------------------------
+# Règles
+# -------------------------------------------------------------------
+
+def _aspect(info):
+    if not info.get("width") or not info.get("height"):
+        return None
+    return info["width"] / info["height"]
+
+
+def check(info: dict):
+    """Retourne (règle satisfaite ou None, liste des problèmes)."""
+    kind = info.get("kind")
+    issues = []
+
+    if kind == "image":
+        if info["width"] != info["height"]:
+            issues.append(f"cover non carrée ({info['width']}x{info['height']})")
+        elif info["width"] < COVER_SIZE:
+            issues.append(f"cover trop petite ({info['width']}x{info['height']}, {COVER_SIZE}x{COVER_SIZE} attendu)")
+        else:
+            return "cover", issues
+        return None, issues
+
+    if kind == "video":
+        aspect = _aspect(info)
+        if aspect is not None and abs(aspect - 9 / 16) < ASPECT_TOLERANCE:
+            return "teaser", issues
+        if aspect is not None and abs(aspect - 16 / 9) < ASPECT_TOLERANCE:
+            return "visualizer", issues
+        issues.append(f"vidéo ni 9:16 ni 16:9 ({info.get('width')}x{info.get('height')})")
+        return None, issues
+
+    if kind == "audio":
+        if info.get("bits") != 24:
+            issues.append(f"WAV {info.get('bits')} bits (24 bits attendus)")
+            return None, issues
+        return "master", issues
+
+    return None, ["format non reconnu"]
+
+
+# -------------------------------------------------------------------
+# Cache
+# -------------------------------------------------------------------
+
+def _cache_path():
+    return label_agent.PROJECTS_DIR / CACHE_FILE
+
+
+def _load_cache():
+    if not _cache["loaded"]:
+        path = _cache_path()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        _cache["data"] = data if isinstance(data, dict) else {}
+        _cache["loaded"] = True
+    return _cache["data"]
+
+
+def _save_cache():
+    """
+    Ecriture atomique (fichier temporaire + os.replace), seulement si des
+    entrées ont été ajoutées. Les entrées écrites entre-temps par un autre
+    process (CLI / app) sont reprises : une entrée ne dépend que du sha256
+    du contenu, la fusion est sans conflit. Les entrées dont plus aucun
+    fichier n'existe sont retirées.
+    """
+    if not _cache["dirty"]:
+        return
+    path = _cache_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        on_disk = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        on_disk = {}
+    data = _cache["data"]
+    if isinstance(on_disk, dict):
+        for key, value in on_disk.items():
+            entry = data.setdefault(key, value)
+            if entry is not value and isinstance(value, dict):
+                entry["paths"] = sorted(set(entry.get("paths") or ()) | set(value.get("paths") or ()))
+
+    for key in list(data):
+        paths = [p for p in data[key].get("paths") or () if os.path.exists(p)]
+        if paths:
+            data[key]["paths"] = paths
+        else:
+            del data[key]
+
+    tmp = path.with_name(f"{CACHE_FILE}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+    _cache["dirty"] = False
+
+
+# -------------------------------------------------------------------
+# Validation
+# -------------------------------------------------------------------
+
+def validate_file(path: Path, content_hash: str = None, save: bool = True):
+    """
+    Valide un fichier : {"file", "info", "rule", "issues"}.
+    `content_hash` est le sha256 du contenu s'il est déjà connu (store) ;
+    avec save=False, le cache n'est écrit qu'au prochain _save_cache().
+    """
+    path = Path(path)
+    key = content_hash or sha256_file(path)
+    location = str(path.resolve())
+
+    with _lock:
+        cached = _load_cache().get(key)
+        if cached is not None and location not in cached.get("paths", ()):
+            cached["paths"] = [*cached.get("paths", ()), location]
+            _cache["dirty"] = True
+            if save:
+                _save_cache()
+    if cached is not None:
+        return _verdict(cached, path)
+
+    try:
+        info = probe(path)
+    except (OSError, AssetError) as e:
+        result = {"info": None, "rule": None, "issues": [str(e)]}
+    else:
+        rule, issues = check(info)
+        result = {"info": info, "rule": rule, "issues": issues}
+
+    with _lock:
+        _load_cache()[key] = dict(result, paths=[location])
+        _cache["dirty"] = True
+        if save:
+            _save_cache()
+    return dict(result, file=path.name)
+
+
+def _verdict(entry, path):
+    return {"file": path.name, "info": entry["info"], "rule": entry["rule"], "issues": entry["issues"]}
+
+
+def validate_project(project_path: Path, tick: bool = False):
+    """
+    Valide les fichiers de `<projet>/assets/` et le master du projet.
+    Avec tick=True, coche les tâches de checklist des règles satisfaites.
+    """
+    assets_dir = project_path / ASSETS_DIRNAME
+    files = sorted(p for p in assets_dir.iterdir() if p.is_file()) if assets_dir.is_dir() else []
+    master = project_path / MASTER_FILE
+    if master.is_file():
+        files.append(master)
+    if not files:
+        return []
+
+    # fichiers venant du store : le sha256 du manifeste sert de clé de cache
+    manifest = label_store.load_manifest(project_path)
+    results = [
+        validate_file(p, manifest.get(p.relative_to(project_path).as_posix()), save=False)
+        for p in files
+    ]
+    with _lock:
+        _save_cache()
+
+    if tick:
+        tick_tasks(project_path, results)
+    return results
+
+
+def _track_key(task_text):
+    """Piste nommée dans une tâche [per_track] (« titre »), en slug, ou None."""
+    match = _TRACK_RE.search(task_text)
+    return slugify(match.group(1)) if match else None
+
+
+def tick_tasks(project_path: Path, results):
+    """
+    Coche les tâches des règles satisfaites par `results` (dicts de
+    validate_file). Pour une tâche répétée par piste ([per_track]), coche
+    celle de la piste dont le nom figure dans le nom du fichier, sinon la
+    première pas encore cochée, sans dépasser le nombre de fichiers valides
+    de la règle : valider à nouveau les mêmes fichiers ne coche rien de plus.
+    Retourne les textes cochés.
+    """
+    files_by_rule = {}
+    for r in results:
+        if r.get("rule"):
+            files_by_rule.setdefault(r["rule"], []).append(r["file"])
+    if not files_by_rule:
+        return []
+
+    text = label_journal.checklist_text(project_path)
+    tasks = [t for _title, section in label_agent.iter_checklist_sections(text) for t in section]
+    ticked = []
+
+    def tick(task):
+        label_journal.set_task(project_path, task["text"], True)
+        task["done"] = True
+        ticked.append(task["text"])
+
+    for rule, files in files_by_rule.items():
+        needle = ASSET_RULES[rule]["task"].lower()
+        candidates = [t for t in tasks if needle in t["text"].lower()]
+        done = sum(t["done"] for t in candidates)
+
+        unmatched = []
+        for name in files:
+            file_key = f"-{slugify(Path(name).stem)}-"
+            match = next(
+                (t for t in candidates if _track_key(t["text"]) and f"-{_track_key(t['text'])}-" in file_key),
+                None,
+            )
+            if match is None:
+                unmatched.append(name)
+            elif not match["done"]:
+                tick(match)
+                done += 1
+
+        for _name in unmatched:
+            match = next((t for t in candidates if not t["done"]), None)
+            if match is None or done >= len(files):
+                break
+            tick(match)
+            done += 1
+    return ticked
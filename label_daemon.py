@@ -0,0 +1,433 @@
+"""
+Démon local pour les commandes de label_agent (scripts, catalogue entier).
+
+`label_agent.py serve` garde en mémoire les modèles compilés, la config des
+genres et l'index des projets, et répond sur une socket Unix
+(PROJECTS_DIR/_daemon.sock), ou en TCP sur 127.0.0.1 quand les sockets Unix
+ne sont pas disponibles (Windows). L'adresse et un jeton d'accès sont écrits
+dans PROJECTS_DIR/_daemon.json.
+
+Protocole : une ligne JSON par requête, une ligne JSON par réponse.
+  {"cmd": "deadline", "slug": "coffee-lofi", "token": "..."}
+  -> {"success": true, "result": {...}}   /   {"success": false, "error": "..."}
+Une ligne contenant une liste de requêtes (lot) reçoit la liste des réponses,
+dans l'ordre, en un seul aller-retour.
+
+Commandes : ping, projects, deadline (slug, slugs ou all), new (description
+libre ou champs), shutdown.
+
+Le client (ce fichier lancé directement) n'importe que la bibliothèque
+standard : pas de PyYAML ni de lecture des modèles à chaque appel.
+`label_agent.py deadline` et `new` passent aussi par le démon s'il tourne,
+et font le calcul eux-mêmes sinon.
+  python label_daemon.py deadline <slug> [<slug> ...]
+  python label_daemon.py deadline --all
+  python label_daemon.py new "Je veux sortir Coffee Lofi, début décembre"
+  python label_daemon.py ping | stop
+"""
+import json
+import os
+import secrets
+import socket
+import sys
+from pathlib import Path
+
+STATE_FILE = "_daemon.json"
+SOCKET_FILE = "_daemon.sock"
+
+# Taille max d'une ligne de requête (octets)
+MAX_LINE = 1024 * 1024
+
+
+def projects_dir() -> Path:
+    """Même emplacement que label_agent.PROJECTS_DIR, sans importer label_agent."""
+    if getattr(sys, "frozen", False):
+        return Path.home() / "AppData" / "Local" / "PulseProjects"
+    return Path(__file__).parent.resolve() / "projects"
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+class DaemonUnavailable(DaemonError):
+    """Pas de démon joignable : la requête n'a pas été envoyée."""
+
+
+# -------------------------------------------------------------------
+# Client
+# -------------------------------------------------------------------
+
+def _load_state(base: Path):
+    try:
+        return json.loads((base / STATE_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        raise DaemonUnavailable("démon non démarré (label_agent.py serve)")
+
+
+def _connect(state, timeout):
+    if state["transport"] == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = state["path"]
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = ("127.0.0.1", state["port"])
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError as e:
+        sock.close()
+        raise DaemonUnavailable(f"démon injoignable : {e}")
+    return sock
+
+
+def send(payload, base: Path = None, timeout: float = 60):
+    """Envoie une requête (dict) ou un lot (liste de dicts) ; retourne la réponse."""
+    state = _load_state(base or projects_dir())
+    if not isinstance(state, dict) or "token" not in state or "transport" not in state:
+        raise DaemonUnavailable("démon non démarré (label_agent.py serve)")
+
+    def with_token(req):
+        return dict(req, token=state["token"])
+
+    if isinstance(payload, list):
+        payload = [with_token(r) for r in payload]
+    else:
+        payload = with_token(payload)
+
+    with _connect(state, timeout) as sock:
+        sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise DaemonError("connexion fermée par le démon")
+    return json.loads(line)
+
+
+def running(base: Path = None) -> bool:
+    """Un démon répond-il déjà pour ce dossier de projets ?"""
+    base = base or projects_dir()
+    try:
+        # n'importe quelle réponse (même jeton refusé) : le démon est vivant
+        send({"cmd": "ping"}, base=base, timeout=2)
+        return True
+    except (DaemonError, OSError, ValueError):
+        pass
+    # _daemon.json absent ou périmé : la socket suffit à le savoir
+    sock_path = base / SOCKET_FILE
+    if hasattr(socket, "AF_UNIX") and sock_path.exists():
+        try:
+            _connect({"transport": "unix", "path": str(sock_path)}, timeout=2).close()
+            return True
+        except DaemonError:
+            return False
+    return False
+
+
+def request(cmd, base: Path = None, **args):
+    """Une commande ; retourne `result` ou lève DaemonError."""
+    response = send(dict(args, cmd=cmd), base=base)
+    if not response.get("success"):
+        raise DaemonError(response.get("error") or "erreur inconnue")
+    return response.get("result")
+
+
+# -------------------------------------------------------------------
+# Serveur
+# -------------------------------------------------------------------
+
+class _WarmProjects:
+    """
+    Métadonnées + checklist de chaque projet, relues seulement quand
+    project.yaml / checklist.md / journal.jsonl changent sur le disque
+    (écritures de l'app desktop comprises).
+    """
+
+    FILES = ("project.yaml", "checklist.md", "journal.jsonl")
+
+    def __init__(self):
+        self._cache = {}
+
+    def get(self, project_path):
+        import label_journal
+
+        sig = []
+        for name in self.FILES:
+            try:
+                st = (project_path / name).stat()
+                sig.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                sig.append(None)
+        sig = tuple(sig)
+
+        key = str(project_path)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == sig:
+            return cached[1], cached[2]
+
+        meta = label_journal.project_meta(project_path)
+        text = label_journal.checklist_text(project_path)
+        self._cache[key] = (sig, meta, text)
+        return meta, text
+
+
+class _Handlers:
+
+    def __init__(self, server_state):
+        self.state = server_state
+        self.warm = _WarmProjects()
+
+    def ping(self, req):
+        return {"pid": os.getpid(), "transport": self.state["transport"]}
+
+    def projects(self, req):
+        import label_agent
+
+        out = []
+        for project_path in label_agent.iter_project_dirs():
+            meta, _text = self.warm.get(project_path)
+            out.append({
+                "slug": project_path.name,
+                "title": meta.get("title"),
+                "artist": meta.get("artist"),
+                "release_date": meta.get("release_date"),
+                "release_type": meta.get("release_type"),
+            })
+        return out
+
+    def _deadline(self, project_path):
+        import label_agent
+        import label_plans
+
+        meta, text = self.warm.get(project_path)
+        deadline = label_agent.next_deadline(meta, label_plans.project_plan(meta), text)
+        return {"slug": project_path.name, "deadline": deadline}
+
+    def deadline(self, req):
+        import label_agent
+
+        if req.get("all"):
+            return [self._deadline(p) for p in label_agent.iter_project_dirs()]
+
+        slugs = req.get("slugs") or ([req["slug"]] if req.get("slug") else [])
+        if not slugs:
+            raise ValueError("slug, slugs ou all requis")
+
+        out = []
+        for slug in slugs:
+            project_path = label_agent.project_dir(slug)
+            if not (project_path / "project.yaml").exists():
+                out.append({"slug": slug, "error": "not-found"})
+            else:
+                out.append(self._deadline(project_path))
+        return out if "slugs" in req else out[0]
+
+    def new(self, req):
+        import contextlib
+        import io
+        from datetime import datetime
+
+        import label_agent
+
+        if req.get("description"):
+            slug, title, release_date, genre = label_agent.parse_project_description(req["description"])
+        else:
+            title = (req.get("title") or "").strip()
+            if not title or not req.get("release_date"):
+                raise ValueError("description, ou title + release_date requis")
+            slug = label_agent.slugify(title)
+            release_date = datetime.strptime(req["release_date"], "%Y-%m-%d")
+            genre = req.get("genre") or "Inconnu"
+
+        if (label_agent.project_dir(slug) / "project.yaml").exists():
+            raise ValueError(f"le projet existe déjà : {slug}")
+
+        # create_project_structure affiche un message (CLI) : pas dans la sortie du démon
+        with contextlib.redirect_stdout(io.StringIO()):
+            label_agent.create_project_structure(
+                slug=slug,
+                title=title,
+                release_date=release_date,
+                genre=genre,
+                artist=req.get("artist") or "AngryTode",
+                label_name=req.get("label") or "AngryTode",
+                use_spotify_canvas=bool(req.get("use_spotify_canvas")),
+                use_paid_ads=bool(req.get("use_paid_ads")),
+                release_type=req.get("release_type") or "Single",
+                tracks=req.get("tracks"),
+            )
+        return {"slug": slug, "path": str(label_agent.project_dir(slug))}
+
+    def shutdown(self, req):
+        self.state["stopping"] = True
+        return {"pid": os.getpid()}
+
+    def handle(self, req):
+        if not isinstance(req, dict):
+            return {"success": False, "error": "bad-request"}
+        if not secrets.compare_digest(str(req.get("token", "")), self.state["token"]):
+            return {"success": False, "error": "bad-token"}
+        cmd = req.get("cmd")
+        if cmd not in ("ping", "projects", "deadline", "new", "shutdown"):
+            return {"success": False, "error": f"unknown-command: {cmd}"}
+        try:
+            return {"success": True, "result": getattr(self, cmd)(req)}
+        except (KeyError, ValueError) as e:
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            import logging
+
+            logging.getLogger(__name__).exception("commande %s", cmd)
+            return {"success": False, "error": repr(e)}
+
+
+def serve(base: Path = None, log=print):
+    """
+    Lance le démon (bloquant) jusqu'à `shutdown` ou Ctrl+C.
+    Lève DaemonError si un démon répond déjà : sa socket et son
+    _daemon.json ne sont pas touchés.
+    """
+    import socketserver
+    import threading
+
+    import label_agent
+    import label_plans
+
+    base = base or label_agent.PROJECTS_DIR
+    base.mkdir(parents=True, exist_ok=True)
+    if running(base):
+        raise DaemonError("un démon tourne déjà pour ces projets (label_daemon.py stop pour l'arrêter)")
+    state = {"token": secrets.token_hex(16), "stopping": False}
+    handlers = _Handlers(state)
+
+    # préchauffage : modèle par défaut, registre, index des dossiers
+    label_plans.load_plan(label_agent.TEMPLATE_FILE)
+    label_agent.load_layout()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in iter(lambda: self.rfile.readline(MAX_LINE + 1), b""):
+                if len(line) > MAX_LINE:
+                    self._reply({"success": False, "error": "request-too-large"})
+                    return
+                if not line.strip():
+                    continue
+                try:
+                    payload = json.loads(line)
+                except ValueError:
+                    self._reply({"success": False, "error": "bad-json"})
+                    continue
+                if isinstance(payload, list):
+                    self._reply([handlers.handle(req) for req in payload])
+                else:
+                    self._reply(handlers.handle(payload))
+                if state["stopping"]:
+                    threading.Thread(target=server.shutdown, daemon=True).start()
+                    return
+
+        def _reply(self, response):
+            self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+    sock_path = base / SOCKET_FILE
+    if hasattr(socket, "AF_UNIX") and len(str(sock_path)) < 100:
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        if sock_path.exists():
+            sock_path.unlink()  # socket orpheline (personne n'y répond, cf. running)
+        server = Server(str(sock_path), Handler)
+        os.chmod(sock_path, 0o600)
+        state.update(transport="unix", path=str(sock_path))
+    else:
+        class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        server = Server(("127.0.0.1", 0), Handler)
+        state.update(transport="tcp", port=server.server_address[1])
+
+    state_path = base / STATE_FILE
+    public = {k: state[k] for k in ("transport", "path", "port", "token") if k in state}
+    public["pid"] = os.getpid()
+    state_path.write_text(json.dumps(public), encoding="utf-8")
+    try:
+        os.chmod(state_path, 0o600)
+    except OSError:
+        pass
+
+    where = state.get("path") or f"127.0.0.1:{state.get('port')}"
+    log(f"Démon PULSE prêt ({state['transport']} {where}), Ctrl+C pour arrêter.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for path in (state_path, sock_path if state["transport"] == "unix" else None):
+            if path is not None and path.exists():
+                path.unlink()
+        log("Démon arrêté.")
+
+
+# -------------------------------------------------------------------
+# Client en ligne de commande
+# -------------------------------------------------------------------
+
+def _print_deadline(entry):
+    if entry.get("error"):
+        print(f"{entry['slug']} : projet introuvable.")
+        return
+    deadline = entry["deadline"]
+    if not deadline:
+        print(f"{entry['slug']} : 🎉 toutes les étapes sont complétées !")
+        return
+    print(f"\n🗓️ {entry['slug']} : prochaine deadline dans {deadline['days_left']} jours ({deadline['title']}) :")
+    for t in deadline["tasks"]:
+        print(f" - [{'x' if t['done'] else ' '}] {t['text']}")
+
+
+def main(argv=None):
+    args = list(sys.argv[1:] if argv is None else argv)
+    if not args:
+        print("Usage : label_daemon.py deadline <slug> [<slug> ...] | --all")
+        print("        label_daemon.py new <description du projet>")
+        print("        label_daemon.py projects")
+        print("        label_daemon.py ping | stop")
+        return 0
+
+    cmd, rest = args[0], args[1:]
+    try:
+        if cmd == "deadline":
+            if rest == ["--all"]:
+                entries = request("deadline", all=True)
+            elif rest:
+                entries = request("deadline", slugs=rest)
+            else:
+                print("Il faut préciser le slug du projet (ou --all).")
+                return 1
+            for entry in entries:
+                _print_deadline(entry)
+            print()
+        elif cmd == "new":
+            result = request("new", description=" ".join(rest))
+            print(f"Projet créé : {result['path']}")
+        elif cmd == "projects":
+            for p in request("projects"):
+                print(f"{p['slug']}\t{p['release_date']}\t{p['title']}")
+        elif cmd == "ping":
+            print(request("ping"))
+        elif cmd == "stop":
+            request("shutdown")
+            print("Démon arrêté.")
+        else:
+            print(f"Commande inconnue : {cmd}")
+            return 1
+    except DaemonError as e:
+        print(f"⚠️  {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Export des deadlines de tous les projets : calendrier ICS et CSV.
+
+Chaque section de checklist (capsule J-xx du modèle) devient un événement daté
+(release_date + day_offset) avec ses tâches restantes.
+Tout est produit par des générateurs : on ne construit jamais le document
+complet en mémoire, même pour des milliers de projets.
+"""
+import csv
+import hashlib
+import io
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import label_agent
+import label_archive
+import label_journal
+import label_plans
+
+# Taille approximative des morceaux envoyés au client (octets)
+CHUNK_SIZE = 64 * 1024
+
+CSV_COLUMNS = [
+    "slug",
+    "title",
+    "artist",
+    "release_date",
+    "step_id",
+    "step_title",
+    "day_offset",
+    "date",
+    "open_tasks_count",
+    "open_tasks",
+]
+
+# Délai max avant de reparcourir les projets pour l'ETag (éditions à la main)
+ETAG_RESCAN_SECONDS = 30
+
+_etag_lock = threading.Lock()
+_etag_cache = {"key": None, "etag": None, "at": 0.0}
+
+
+# -------------------------------------------------------------------
+# Evénements
+# -------------------------------------------------------------------
+
+def project_events(slug, project, checklist):
+    """
+    Yield un dict par section datée d'une checklist :
+      {"slug", "title", "artist", "release_date", "step_id", "step_title",
+       "day_offset", "date", "open_tasks"}
+    """
+    try:
+        release_date = datetime.strptime(project.get("release_date") or "", "%Y-%m-%d").date()
+    except ValueError:
+        return
+
+    steps = label_plans.project_plan(project)["index"]
+    for sid, title, tasks in label_agent.iter_checklist_steps(checklist):
+        step = steps.get(sid) if sid else steps.get(title)
+        if not step or step.get("day_offset") is None:
+            continue
+        offset = step["day_offset"]
+        yield {
+            "slug": slug,
+            "title": project.get("title", slug),
+            "artist": project.get("artist", ""),
+            "release_date": release_date,
+            "step_id": step["id"],
+            "step_title": title,
+            "day_offset": offset,
+            "date": release_date + timedelta(days=offset),
+            "open_tasks": [t["text"] for t in tasks if not t["done"]],
+        }
+
+
+def iter_project_events(project_path):
+    """Evénements d'un projet actif (voir project_events), journal compris."""
+    return project_events(
+        project_path.name,
+        label_journal.project_meta(project_path),
+        label_journal.checklist_text(project_path),
+    )
+
+
+def iter_deadline_events():
+    """
+    Evénements de tous les projets : actifs, puis archivés (gardés dans
+    l'index de label_archive, sans décompresser les archives).
+    """
+    for project_path in label_agent.iter_project_dirs():
+        yield from iter_project_events(project_path)
+    for events in label_archive.archived_events().values():
+        for ev in events:
+            yield dict(
+                ev,
+                release_date=date.fromisoformat(ev["release_date"]),
+                date=date.fromisoformat(ev["date"]),
+            )
+
+
+def _chunked(pieces):
+    """Regroupe de petites chaînes en morceaux d'environ CHUNK_SIZE."""
+    buf = []
+    size = 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield "".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield "".join(buf)
+
+
+# -------------------------------------------------------------------
+# ICS
+# -------------------------------------------------------------------
+
+def _ics_escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _ics_fold(line: str) -> str:
+    """Coupe les lignes à 75 octets (RFC 5545), sans couper un caractère UTF-8."""
+    out = []
+    current = ""
+    current_size = 0
+    limit = 75
+    for ch in line:
+        ch_size = len(ch.encode("utf-8"))
+        if current_size + ch_size > limit:
+            out.append(current)
+            current = " "
+            current_size = 1
+            limit = 75
+        current += ch
+        current_size += ch_size
+    out.append(current)
+    return "\r\n".join(out) + "\r\n"
+
+
+def _iter_ics_lines():
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    yield "BEGIN:VCALENDAR\r\n"
+    yield "VERSION:2.0\r\n"
+    yield "PRODID:-//PULSE//Release plan//FR\r\n"
+    yield "CALSCALE:GREGORIAN\r\n"
+    yield "X-WR-CALNAME:PULSE - Deadlines\r\n"
+
+    for ev in iter_deadline_events():
+        if ev["open_tasks"]:
+            description = "Tâches restantes :\n" + "\n".join(f"- {t}" for t in ev["open_tasks"])
+        else:
+            description = "Toutes les tâches sont faites."
+
+        yield "BEGIN:VEVENT\r\n"
+        yield _ics_fold(f"UID:{ev['slug']}-{ev['step_id']}@pulse")
+        yield f"DTSTAMP:{stamp}\r\n"
+        yield f"DTSTART;VALUE=DATE:{ev['date']:%Y%m%d}\r\n"
+        yield f"DTEND;VALUE=DATE:{ev['date'] + timedelta(days=1):%Y%m%d}\r\n"
+        yield _ics_fold("SUMMARY:" + _ics_escape(f"{ev['title']} - {ev['step_title']}"))
+        yield _ics_fold("DESCRIPTION:" + _ics_escape(description))
+        if ev["artist"]:
+            yield _ics_fold("CATEGORIES:" + _ics_escape(ev["artist"]))
+        yield "END:VEVENT\r\n"
+
+    yield "END:VCALENDAR\r\n"
+
+
+def iter_ics():
+    """Calendrier ICS de toutes les deadlines, par morceaux."""
+    return _chunked(_iter_ics_lines())
+
+
+# -------------------------------------------------------------------
+# CSV
+# -------------------------------------------------------------------
+
+def _iter_csv_rows():
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def flush():
+        value = buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+        return value
+
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+
+    for ev in iter_deadline_events():
+        writer.writerow([
+            ev["slug"],
+            ev["title"],
+            ev["artist"],
+            ev["release_date"].isoformat(),
+            ev["step_id"],
+            ev["step_title"],
+            ev["day_offset"],
+            ev["date"].isoformat(),
+            len(ev["open_tasks"]),
+            " | ".join(ev["open_tasks"]),
+        ])
+        yield flush()
+
+
+def iter_csv():
+    """CSV de toutes les deadlines (une ligne par section), par morceaux."""
+    return _chunked(_iter_csv_rows())
+
+
+# -------------------------------------------------------------------
+# ETag
+# -------------------------------------------------------------------
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+        return f"{st.st_size}:{st.st_mtime_ns}"
+    except OSError:
+        return "-"
+
+
+def _dirs_key():
+    """
+    Stat des dossiers du catalogue (racine, sous-dossiers de _shards/, index
+    des archives) : voit les projets créés / supprimés / archivés par un
+    autre process (CLI) sans parcourir les projets.
+    """
+    root = os.fspath(label_agent.PROJECTS_DIR)
+    key = [_stat_key(root), _stat_key(os.path.join(root, label_archive.ARCHIVE_DIRNAME, label_archive.INDEX_FILE))]
+    shards = os.path.join(root, label_agent.SHARDS_DIRNAME)
+    try:
+        entries = sorted(os.scandir(shards), key=lambda e: e.name)
+    except OSError:
+        entries = []
+    for entry in entries:
+        if entry.is_dir():
+            key.append(f"{entry.name}:{_stat_key(entry.path)}")
+    return "|".join(key)
+
+
+def _compute_etag():
+    h = hashlib.sha1()
+    h.update(label_plans.registry_key().encode("utf-8"))
+    # chemins en str : pathlib coûte plus cher que les stat eux-mêmes ici
+    for path in sorted(os.fspath(p) for p in label_agent.iter_project_dirs()):
+        h.update(path.encode("utf-8"))
+        for name in ("project.yaml", "checklist.md", label_journal.JOURNAL_FILE):
+            h.update(_stat_key(os.path.join(path, name)).encode())
+    h.update(_dirs_key().encode("utf-8"))
+    return h.hexdigest()
+
+
+def catalog_etag() -> str:
+    """
+    ETag des exports : version des modèles + taille / date de project.yaml,
+    checklist.md et du journal de chaque projet, et des archives.
+
+    Le parcours de tous les projets n'est refait que si la clé change
+    (écriture dans l'app via catalog_version, modèle modifié, dossier de
+    projets ou de shard modifié par la CLI), ou au plus tard toutes les
+    ETAG_RESCAN_SECONDS : une checklist éditée à la main sur place ne touche
+    aucun dossier.
+    """
+    key = (label_agent.catalog_version(), label_plans.registry_key(), _dirs_key())
+    now = time.monotonic()
+    with _etag_lock:
+        if _etag_cache["key"] == key and now - _etag_cache["at"] < ETAG_RESCAN_SECONDS:
+            return _etag_cache["etag"]
+
+    etag = _compute_etag()
+    with _etag_lock:
+        _etag_cache.update(key=key, etag=etag, at=now)
+    return etag
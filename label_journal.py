@@ -0,0 +1,653 @@
+"""
+Journal append-only des modifications d'un projet.
+
+Chaque coche de tâche, modification des notes ou des métadonnées est ajoutée
+en une ligne JSON à la fin de `journal.jsonl` (écriture O(1)) au lieu de
+réécrire checklist.md / notes.txt / project.yaml en entier.
+
+Les fichiers Markdown / texte / YAML restent la référence lisible : ils sont
+recompactés à partir du journal quand trop d'événements sont en attente, quand
+le projet est inactif depuis un moment, ou à la fermeture de l'app.
+
+Compaction en trois temps :
+  1. un marqueur `compacted` est ajouté au journal, avec l'empreinte (sha256)
+     du nouveau contenu de chaque fichier réécrit et les piles
+     d'annulation / rétablissement,
+  2. les fichiers sont réécrits (remplacement atomique),
+  3. les événements compactés passent dans `journal.history.jsonl` et
+     `journal.jsonl` est remplacé par le seul marqueur.
+Au chargement, seuls les événements suivant le dernier marqueur sont rejoués
+sur un fichier qui porte son empreinte. Si l'app s'est arrêtée entre 1 et 2,
+le fichier n'a pas été réécrit : on rejoue depuis le marqueur précédent.
+Le rejeu reste ainsi borné et n'applique jamais deux fois un patch des notes.
+
+`journal.history.jsonl` garde l'historique complet (dates de complétion des
+tâches) ; il n'est lu que par task_history.
+
+Les notes sont toujours stockées et hashées avec des fins de ligne LF
+(un formulaire HTML envoie du CRLF, un textarea lu en JS du LF).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+import label_agent
+
+JOURNAL_FILE = "journal.jsonl"
+HISTORY_FILE = "journal.history.jsonl"
+
+# Fichiers matérialisés, par nature d'événement
+_FILES = {"checklist": "checklist.md", "notes": "notes.txt", "meta": "project.yaml"}
+
+# Nombre d'événements en attente avant une compaction forcée
+COMPACT_AFTER = 200
+# Un projet sans écriture depuis ce délai (secondes) est compacté par le thread
+IDLE_COMPACT_SECONDS = 30
+# Délai de regroupement des sauvegardes automatiques des notes (secondes)
+AUTOSAVE_DELAY = 2.0
+
+# Types d'événements annulables
+TASK_TOGGLED = "task_toggled"
+NOTES_PATCHED = "notes_patched"
+META_EDITED = "meta_edited"
+USER_EVENTS = (TASK_TOGGLED, NOTES_PATCHED, META_EDITED)
+_EVENT_FILE = {TASK_TOGGLED: "checklist", NOTES_PATCHED: "notes", META_EDITED: "meta"}
+
+# Evénements annulables gardés dans le marqueur de compaction
+UNDO_DEPTH = 50
+
+# Parseur C de PyYAML (libyaml) quand il est disponible : bien plus rapide
+# pour les parcours de tout le catalogue (migration, exports...)
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+log = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_states = {}
+_notes_buffer = {}
+
+
+# -------------------------------------------------------------------
+# Etat matérialisé d'un projet
+# -------------------------------------------------------------------
+
+class _ProjectState:
+    """Fichiers du projet + événements du journal rejoués, en mémoire."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.checklist = []
+        self.notes = ""
+        self.meta = {}
+        self.seq = 0
+        self.pending = 0
+        self.events = {}
+        self.undo_stack = []
+        self.redo_stack = []
+        self.dirty = set()
+        self.last_write = 0.0
+        self.signature = None
+
+
+def _parse_yaml(text: str):
+    try:
+        data = yaml.load(text, Loader=_YamlLoader)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _read_yaml(path: Path):
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.load(f, Loader=_YamlLoader)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _read_text(path: Path) -> str:
+    return path.read_text(encoding="utf-8") if path.exists() else ""
+
+
+def normalize_newlines(text: str) -> str:
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _signature(root: Path):
+    """Tailles / dates des fichiers, pour détecter une édition manuelle."""
+    sig = []
+    for name in ("checklist.md", "notes.txt", "project.yaml", JOURNAL_FILE):
+        try:
+            st = (root / name).stat()
+            sig.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def _read_events(path: Path):
+    if not path.exists():
+        return []
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # ligne tronquée (coupure pendant l'écriture) : ignorée
+                continue
+    return events
+
+
+def _event_file(state, ev):
+    """Fichier touché par un événement (celui de sa cible pour undo / redo)."""
+    kind = ev.get("type")
+    if kind in ("undo", "redo"):
+        target = state.events.get(ev.get("target"))
+        kind = target.get("type") if target else None
+    return _EVENT_FILE.get(kind)
+
+
+def _load(root: Path) -> _ProjectState:
+    state = _ProjectState(root)
+    texts = {kind: _read_text(root / name) for kind, name in _FILES.items()}
+    state.checklist = texts["checklist"].splitlines()
+    state.notes = normalize_newlines(texts["notes"])
+    state.meta = _parse_yaml(texts["meta"])
+
+    events = _read_events(root / JOURNAL_FILE)
+    markers = [i for i, ev in enumerate(events) if ev.get("type") == "compacted"]
+    last = markers[-1] if markers else -1
+    previous = markers[-2] if len(markers) > 1 else -1
+
+    # Point de départ du rejeu, par fichier : le dernier marqueur si le
+    # fichier porte son empreinte, sinon le précédent (compaction interrompue
+    # avant la réécriture du fichier, ou fichier modifié à la main)
+    base = (events[last].get("base") or {}) if last >= 0 else {}
+    replay_from = {}
+    for kind in _FILES:
+        expected = base.get(kind)
+        if expected is None or expected == notes_hash(texts[kind]):
+            replay_from[kind] = last
+        else:
+            replay_from[kind] = previous
+
+    for i, ev in enumerate(events):
+        state.seq = max(state.seq, ev.get("seq", 0))
+        kind = _event_file(state, ev)
+        _track(state, ev)
+        if kind is not None and i > replay_from[kind]:
+            _apply(state, ev)
+            state.pending += 1
+
+    state.signature = _signature(root)
+    return state
+
+
+def _get(root: Path) -> _ProjectState:
+    key = str(root)
+    state = _states.get(key)
+    if state is None or state.signature != _signature(root):
+        state = _load(root)
+        _states[key] = state
+    return state
+
+
+# -------------------------------------------------------------------
+# Application des événements
+# -------------------------------------------------------------------
+
+def _set_task(lines, task_text, done):
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if (stripped.startswith("- [ ]") or stripped.startswith("- [x]")) and stripped[5:].strip() == task_text:
+            if done:
+                lines[i] = line.replace("- [ ]", "- [x]", 1)
+            else:
+                lines[i] = line.replace("- [x]", "- [ ]", 1)
+            return True
+    return False
+
+
+def _inverse(ev):
+    kind = ev["type"]
+    if kind == TASK_TOGGLED:
+        return {"type": kind, "task": ev["task"], "done": not ev["done"]}
+    if kind == NOTES_PATCHED:
+        return {
+            "type": kind,
+            "start": ev["start"],
+            "end": ev["start"] + len(ev["text"]),
+            "text": ev["removed"],
+            "removed": ev["text"],
+        }
+    if kind == META_EDITED:
+        return {"type": kind, "changes": {k: [new, old] for k, (old, new) in ev["changes"].items()}}
+    return None
+
+
+def _apply_effect(state, ev):
+    kind = ev.get("type")
+    if kind == TASK_TOGGLED:
+        if _set_task(state.checklist, ev["task"], ev["done"]):
+            state.dirty.add("checklist")
+    elif kind == NOTES_PATCHED:
+        notes = state.notes
+        state.notes = notes[:ev["start"]] + ev["text"] + notes[ev["end"]:]
+        state.dirty.add("notes")
+    elif kind == META_EDITED:
+        for key, (_old, new) in ev["changes"].items():
+            state.meta[key] = new
+        state.dirty.add("meta")
+
+
+def _apply(state, ev):
+    kind = ev.get("type")
+    if kind in USER_EVENTS:
+        _apply_effect(state, ev)
+    elif kind == "undo":
+        target = state.events.get(ev.get("target"))
+        if target:
+            _apply_effect(state, _inverse(target))
+    elif kind == "redo":
+        target = state.events.get(ev.get("target"))
+        if target:
+            _apply_effect(state, target)
+
+
+def _track(state, ev):
+    """Met à jour les piles d'annulation / rétablissement."""
+    kind = ev.get("type")
+    if kind in USER_EVENTS:
+        state.events[ev["seq"]] = ev
+        state.undo_stack.append(ev["seq"])
+        state.redo_stack.clear()
+    elif kind == "undo" and state.undo_stack:
+        state.redo_stack.append(state.undo_stack.pop())
+    elif kind == "redo" and state.redo_stack:
+        state.undo_stack.append(state.redo_stack.pop())
+    elif kind == "compacted" and "undo" in ev:
+        state.events = {e["seq"]: e for e in ev["undo"] + ev.get("redo", [])}
+        state.undo_stack = [e["seq"] for e in ev["undo"]]
+        state.redo_stack = [e["seq"] for e in ev.get("redo", [])]
+
+
+def _append(state, ev):
+    state.seq += 1
+    ev = {"seq": state.seq, "ts": datetime.now().isoformat(timespec="seconds"), **ev}
+    with open(state.root / JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+
+    _track(state, ev)
+    _apply(state, ev)
+    state.pending += 1
+    state.last_write = time.monotonic()
+    state.signature = _signature(state.root)
+    label_agent.touch_catalog(state.root.name)
+
+    if state.pending >= COMPACT_AFTER:
+        _compact(state)
+    return ev
+
+
+# -------------------------------------------------------------------
+# Lecture
+# -------------------------------------------------------------------
+
+def checklist_text(root: Path) -> str:
+    """Contenu courant de checklist.md (journal en attente inclus)."""
+    with _lock:
+        if str(root) not in _states and not (root / JOURNAL_FILE).exists():
+            path = root / "checklist.md"
+            return path.read_text(encoding="utf-8") if path.exists() else ""
+        return "\n".join(_get(root).checklist)
+
+
+def notes_text(root: Path) -> str:
+    """Notes courantes, y compris une sauvegarde automatique pas encore écrite."""
+    with _lock:
+        entry = _notes_buffer.get(str(root))
+        if entry is not None:
+            return entry["text"]
+        if str(root) not in _states and not (root / JOURNAL_FILE).exists():
+            return normalize_newlines(_read_text(root / "notes.txt"))
+        return _get(root).notes
+
+
+def notes_hash(text: str) -> str:
+    """sha256 du texte, fins de ligne normalisées."""
+    return hashlib.sha256(normalize_newlines(text).encode("utf-8")).hexdigest()
+
+
+def project_meta(root: Path) -> dict:
+    """
+    Contenu courant de project.yaml.
+    Sans journal, lit simplement le YAML sans garder l'état en cache
+    (cas du tableau de bord qui parcourt tous les projets).
+    """
+    with _lock:
+        if str(root) not in _states and not (root / JOURNAL_FILE).exists():
+            return _read_yaml(root / "project.yaml")
+        return dict(_get(root).meta)
+
+
+def task_history(root: Path):
+    """Liste chronologique des changements d'état des tâches (annulations incluses)."""
+    with _lock:
+        events = _read_events(root / HISTORY_FILE) + _read_events(root / JOURNAL_FILE)
+
+    history = []
+    state = _ProjectState(root)
+    last_seq = 0
+    for ev in events:
+        # une rotation interrompue peut avoir recopié des événements deux fois
+        if ev.get("type") == "compacted" or ev.get("seq", 0) <= last_seq:
+            continue
+        last_seq = ev.get("seq", 0)
+        _track(state, ev)
+        kind = ev.get("type")
+        if kind == TASK_TOGGLED:
+            change = ev
+        elif kind in ("undo", "redo") and ev.get("target") in state.events:
+            target = state.events[ev["target"]]
+            change = target if kind == "redo" else _inverse(target)
+        else:
+            continue
+        if change.get("type") == TASK_TOGGLED:
+            history.append({"task": change["task"], "done": change["done"], "ts": ev.get("ts")})
+    return history
+
+
+# -------------------------------------------------------------------
+# Ecriture
+# -------------------------------------------------------------------
+
+def set_task(root: Path, task_text: str, done: bool):
+    """
+    Coche / décoche une tâche. Retourne le nouvel état,
+    ou None si la tâche n'existe pas.
+    """
+    with _lock:
+        state = _get(root)
+        current = None
+        for line in state.checklist:
+            stripped = line.strip()
+            if (stripped.startswith("- [ ]") or stripped.startswith("- [x]")) and stripped[5:].strip() == task_text:
+                current = stripped.startswith("- [x]")
+                break
+        if current is None:
+            return None
+        if current != done:
+            _append(state, {"type": TASK_TOGGLED, "task": task_text, "done": done})
+        return done
+
+
+def toggle_task(root: Path, task_text: str):
+    with _lock:
+        state = _get(root)
+        for line in state.checklist:
+            stripped = line.strip()
+            if (stripped.startswith("- [ ]") or stripped.startswith("- [x]")) and stripped[5:].strip() == task_text:
+                return set_task(root, task_text, not stripped.startswith("- [x]"))
+        return None
+
+
+def notes_patch(old: str, new: str):
+    """Plus petit remplacement old[start:end] -> text transformant old en new."""
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end_old, end_new = len(old), len(new)
+    while end_old > start and end_new > start and old[end_old - 1] == new[end_new - 1]:
+        end_old -= 1
+        end_new -= 1
+    return start, end_old, new[start:end_new]
+
+
+def write_notes(root: Path, text: str) -> bool:
+    """Enregistre le nouveau texte des notes sous forme de patch. False si inchangé."""
+    text = normalize_newlines(text)
+    with _lock:
+        _drop_buffer(root)
+        state = _get(root)
+        if text == state.notes:
+            return False
+        start, end, inserted = notes_patch(state.notes, text)
+        _append(state, {
+            "type": NOTES_PATCHED,
+            "start": start,
+            "end": end,
+            "text": inserted,
+            "removed": state.notes[start:end],
+        })
+        return True
+
+
+def edit_meta(root: Path, fields: dict) -> dict:
+    """Modifie des champs de project.yaml. Retourne {champ: [ancien, nouveau]}."""
+    with _lock:
+        state = _get(root)
+        changes = {k: [state.meta.get(k), v] for k, v in fields.items() if state.meta.get(k) != v}
+        if changes:
+            _append(state, {"type": META_EDITED, "changes": changes})
+        return changes
+
+
+def undo(root: Path):
+    """Annule le dernier événement. Retourne l'événement annulé ou None."""
+    with _lock:
+        state = _get(root)
+        if not state.undo_stack:
+            return None
+        target = state.undo_stack[-1]
+        _append(state, {"type": "undo", "target": target})
+        return state.events[target]
+
+
+def redo(root: Path):
+    with _lock:
+        state = _get(root)
+        if not state.redo_stack:
+            return None
+        target = state.redo_stack[-1]
+        _append(state, {"type": "redo", "target": target})
+        return state.events[target]
+
+
+# -------------------------------------------------------------------
+# Sauvegarde automatique des notes (écriture différée)
+# -------------------------------------------------------------------
+
+def _drop_buffer(root: Path):
+    entry = _notes_buffer.pop(str(root), None)
+    if entry is not None:
+        entry["timer"].cancel()
+    return entry
+
+
+class NotesConflict(Exception):
+    """Les notes ont changé depuis la version `base` du client."""
+
+    def __init__(self, notes):
+        super().__init__("notes modifiées entre-temps")
+        self.notes = notes
+
+
+def buffer_notes(root: Path, text: str, delay: float = AUTOSAVE_DELAY, base: str = None) -> bool:
+    """
+    Garde le texte en mémoire et ne l'écrit dans le journal qu'après `delay`
+    secondes sans nouvelle sauvegarde : une rafale d'autosaves ne produit
+    qu'un seul patch. False si le texte est identique à l'actuel.
+    `base` : hash des notes sur lesquelles `text` a été calculé ; comparé
+    sous le verrou, NotesConflict si elles ont changé entre-temps.
+    """
+    text = normalize_newlines(text)
+    with _lock:
+        current = notes_text(root)
+        if base is not None and notes_hash(current) != base:
+            raise NotesConflict(current)
+        if text == current:
+            return False
+        _drop_buffer(root)
+        timer = threading.Timer(delay, flush_notes, args=(root,))
+        timer.daemon = True
+        _notes_buffer[str(root)] = {"root": root, "text": text, "timer": timer}
+        timer.start()
+        return True
+
+
+def flush_notes(root: Path = None):
+    """Ecrit les notes en attente (d'un projet, ou de tous si root est None)."""
+    with _lock:
+        if root is None:
+            entries = [_drop_buffer(e["root"]) for e in list(_notes_buffer.values())]
+        else:
+            entries = [_drop_buffer(root)]
+        for entry in entries:
+            if entry is not None and entry["root"].exists():
+                write_notes(entry["root"], entry["text"])
+
+
+# -------------------------------------------------------------------
+# Compaction
+# -------------------------------------------------------------------
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _compact(state):
+    root = state.root
+    if not root.exists():
+        return
+    if state.pending == 0:
+        return
+
+    texts = {}
+    if "checklist" in state.dirty:
+        texts["checklist"] = "\n".join(state.checklist)
+    if "notes" in state.dirty:
+        texts["notes"] = state.notes
+    if "meta" in state.dirty:
+        texts["meta"] = yaml.dump(state.meta, allow_unicode=True)
+
+    # 1. marqueur : empreinte du contenu compacté + piles d'annulation
+    undo = [state.events[s] for s in state.undo_stack[-UNDO_DEPTH:]]
+    redo = [state.events[s] for s in state.redo_stack[-UNDO_DEPTH:]]
+    state.seq += 1
+    marker = {
+        "seq": state.seq,
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "type": "compacted",
+        "base": {kind: notes_hash(text) for kind, text in texts.items()},
+        "undo": undo,
+        "redo": redo,
+    }
+    with open(root / JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(marker, ensure_ascii=False) + "\n")
+
+    # 2. fichiers
+    for kind, text in texts.items():
+        _write_atomic(root / _FILES[kind], text)
+    state.dirty.clear()
+
+    # 3. rotation du journal
+    _rotate(root, marker["seq"])
+    state.pending = 0
+    state.signature = _signature(root)
+
+
+def _rotate(root: Path, marker_seq: int):
+    """
+    Déplace les événements antérieurs au marqueur `marker_seq` dans
+    HISTORY_FILE ; journal.jsonl repart du marqueur.
+    """
+    path = root / JOURNAL_FILE
+    events = _read_events(path)
+    done = [ev for ev in events if ev.get("seq", 0) < marker_seq and ev.get("type") != "compacted"]
+    kept = [ev for ev in events if ev.get("seq", 0) >= marker_seq]
+    if done:
+        with open(root / HISTORY_FILE, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(ev, ensure_ascii=False) + "\n" for ev in done)
+    _write_atomic(path, "".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in kept))
+
+
+def compact(root: Path):
+    with _lock:
+        state = _states.get(str(root))
+        if state is None:
+            state = _get(root)
+        _compact(state)
+
+
+def compact_idle(idle_seconds: float = IDLE_COMPACT_SECONDS):
+    """Compacte les projets inactifs et libère leur état en mémoire."""
+    now = time.monotonic()
+    with _lock:
+        for key, state in list(_states.items()):
+            if now - state.last_write < idle_seconds:
+                continue
+            _compact(state)
+            del _states[key]
+
+
+def compact_all():
+    flush_notes()
+    compact_idle(idle_seconds=0)
+
+
+def rewrite(root: Path, checklist: str = None, meta: dict = None, expected: str = None) -> bool:
+    """
+    Remplace checklist.md et/ou project.yaml hors journal (migration de modèle).
+    Les événements en attente sont compactés avant. Si `expected` est donné et
+    que la checklist a changé entre-temps, rien n'est écrit et on retourne False.
+    """
+    with _lock:
+        if str(root) in _states or (root / JOURNAL_FILE).exists():
+            compact(root)
+        if expected is not None and checklist_text(root) != expected:
+            return False
+        if checklist is not None:
+            _write_atomic(root / "checklist.md", checklist)
+        if meta is not None:
+            _write_atomic(root / "project.yaml", yaml.dump(meta, allow_unicode=True))
+        _states.pop(str(root), None)
+    return True
+
+
+def forget(root: Path):
+    """Oublie l'état d'un projet (suppression) sans rien écrire."""
+    with _lock:
+        _drop_buffer(root)
+        _states.pop(str(root), None)
+
+
+def start_compactor(interval: float = IDLE_COMPACT_SECONDS):
+    """Lance le thread de compaction des projets inactifs."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                compact_idle()
+            except Exception:
+                log.exception("compaction des journaux")
+
+    t = threading.Thread(target=loop, name="pulse-journal-compactor", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,218 @@
+"""
+Journalisation de l'app (diagnostics), sans écriture disque dans les requêtes.
+
+Les threads qui loguent (requêtes Flask, threads de fond) ne font que poser
+l'enregistrement dans une file (QueueHandler) ; un thread dédié
+(QueueListener) le formate en JSON et l'écrit :
+  - `pulse.log`        : tout (INFO et plus), une ligne JSON par événement,
+  - `_pulse_error.log` : erreurs seulement (ERROR et plus).
+Les deux fichiers tournent à partir d'une taille fixe (RotatingFileHandler)
+au lieu d'être effacés à la fermeture de l'app.
+
+Chaque requête reçoit un identifiant (en-tête X-Request-ID, repris s'il est
+fourni) ajouté à tous les logs émis pendant son traitement, et une ligne
+`request` avec la méthode, le chemin, le statut et la durée.
+Les lignes `request` réussies et rapides sont échantillonnées
+(ACCESS_SAMPLE_RATE) : la sauvegarde auto des notes, par exemple, en envoie
+une toutes les deux secondes. Erreurs et requêtes lentes sont toujours gardées.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+LOG_FILE = "pulse.log"
+ERROR_LOG_FILE = "_pulse_error.log"
+
+# Rotation : taille max d'un fichier et nombre de fichiers gardés
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+# Proportion des lignes `request` gardées (hors erreurs / requêtes lentes)
+ACCESS_SAMPLE_RATE = 0.1
+SLOW_REQUEST_MS = 500
+
+ACCESS_LOGGER = "pulse.access"
+
+# Champs standard d'un LogRecord (le reste = champs `extra=` à sérialiser)
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_request_id = contextvars.ContextVar("pulse_request_id", default=None)
+_listener = None
+
+
+def request_id():
+    """Identifiant de la requête en cours (ou None hors requête)."""
+    return _request_id.get()
+
+
+# -------------------------------------------------------------------
+# Format / filtres
+# -------------------------------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Ajoute l'id de requête (exécuté dans le thread qui logue, avant la file)."""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Garde une proportion `rate` des enregistrements de `logger_name` sous
+    WARNING, sauf ceux marqués `extra={"_keep": True}`.
+    """
+
+    def __init__(self, logger_name, rate):
+        super().__init__()
+        self.logger_name = logger_name
+        self.rate = rate
+
+    def filter(self, record):
+        if record.name != self.logger_name or record.levelno >= logging.WARNING:
+            return True
+        if getattr(record, "_keep", False):
+            return True
+        return random.random() < self.rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Comme QueueHandler, mais garde la trace d'exception dans son propre champ
+    (le handler standard la fusionne dans le message).
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# -------------------------------------------------------------------
+# Mise en place
+# -------------------------------------------------------------------
+
+def setup(log_dir, level=logging.INFO, sample_rate=ACCESS_SAMPLE_RATE):
+    """
+    Branche le logger racine sur la file et démarre le thread d'écriture.
+    Sans effet si déjà fait.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_dir.mkdir(parents=True, exist_ok=True)
+    formatter = JsonFormatter()
+
+    main_handler = logging.handlers.RotatingFileHandler(
+        log_dir / LOG_FILE, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    main_handler.setFormatter(formatter)
+
+    error_handler = logging.handlers.RotatingFileHandler(
+        log_dir / ERROR_LOG_FILE, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8", delay=True
+    )
+    error_handler.setLevel(logging.ERROR)
+    error_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter(ACCESS_LOGGER, sample_rate))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    # La ligne d'accès de werkzeug (stderr, dans le thread de la requête)
+    # est remplacée par la ligne `request` échantillonnée
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, main_handler, error_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(shutdown)
+    return _listener
+
+
+def shutdown():
+    """Vide la file et arrête le thread d'écriture."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def init_app(app):
+    """Id de requête + ligne `request` (durée, statut) pour chaque requête Flask."""
+    from flask import g, request
+
+    access = logging.getLogger(ACCESS_LOGGER)
+
+    @app.before_request
+    def _start_request():
+        g.log_start = time.perf_counter()
+        g.log_token = _request_id.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12])
+
+    @app.after_request
+    def _end_request(response):
+        start = g.pop("log_start", None)
+        if start is not None:
+            duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            level = logging.ERROR if response.status_code >= 500 else logging.INFO
+            access.log(
+                level,
+                "request",
+                extra={
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "duration_ms": duration_ms,
+                    "_keep": duration_ms >= SLOW_REQUEST_MS,
+                },
+            )
+        rid = _request_id.get()
+        if rid:
+            response.headers["X-Request-ID"] = rid
+        return response
+
+    @app.teardown_request
+    def _teardown_request(exc):
+        # les exceptions non gérées sont déjà loguées par Flask / werkzeug
+        token = g.pop("log_token", None)
+        if token is not None:
+            _request_id.reset(token)
@@ -0,0 +1,432 @@
+"""
+Analyse de loudness d'un master WAV.
+
+  - LUFS intégré : ITU-R BS.1770-4 (pondération K, blocs de 400 ms,
+    portes absolue -70 LUFS et relative -10 LU)
+  - Loudness range (LRA) : EBU Tech 3342 (short-term 3 s, portes -70 / -20 LU)
+  - True-peak : suréchantillonnage x4 (x2 au-delà de 96 kHz) par FIR polyphase
+
+Le fichier n'est jamais chargé en entier : les données sont lues par morceaux
+de quelques secondes via np.memmap, et le filtrage est vectorisé avec NumPy
+(convolution FFT par la réponse impulsionnelle de la pondération K).
+Seules les énergies par tranche de 100 ms sont gardées en mémoire.
+
+Dans l'app, l'analyse du master envoyé tourne dans un thread dédié
+(analyze_in_background) : la requête d'envoi répond tout de suite et
+master_analysis.yaml indique `status: pending` jusqu'au résultat.
+"""
+import logging
+import math
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+import label_assets
+
+log = logging.getLogger(__name__)
+
+# Durée des morceaux lus (secondes, multiple de 100 ms)
+CHUNK_SECONDS = 10
+
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+LRA_RELATIVE_GATE = -20.0
+
+# Plafond true-peak visé pour le streaming
+TRUE_PEAK_CEILING = -1.0
+
+MASTER_FILE = label_assets.MASTER_FILE
+ANALYSIS_FILE = "master_analysis.yaml"
+
+PENDING = "pending"
+
+_jobs_lock = threading.Lock()
+_jobs = {}
+_executor = None
+
+# -------------------------------------------------------------------
+# Décodage des échantillons
+# -------------------------------------------------------------------
+
+def _decode(raw, info):
+    """Octets (frames, block_align) -> float32 (frames, channels) dans [-1, 1]."""
+    fmt, bits, channels = info["format"], info["bits"], info["channels"]
+    n = raw.shape[0]
+
+    if fmt == label_assets.WAVE_FORMAT_PCM and bits == 24:
+        b = raw[:, :channels * 3].reshape(n, channels, 3).astype(np.int32)
+        v = b[..., 0] | (b[..., 1] << 8) | (b[..., 2] << 16)
+        v = (v << 8) >> 8  # extension de signe
+        return v.astype(np.float32) / 8388608.0
+    if fmt == label_assets.WAVE_FORMAT_PCM and bits == 16:
+        return raw.view("<i2").reshape(n, -1)[:, :channels].astype(np.float32) / 32768.0
+    if fmt == label_assets.WAVE_FORMAT_PCM and bits == 32:
+        return raw.view("<i4").reshape(n, -1)[:, :channels].astype(np.float32) / 2147483648.0
+    if fmt == label_assets.WAVE_FORMAT_PCM and bits == 8:
+        return (raw[:, :channels].astype(np.float32) - 128.0) / 128.0
+    if fmt == label_assets.WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        return raw.view("<f4").reshape(n, -1)[:, :channels].astype(np.float32)
+    if fmt == label_assets.WAVE_FORMAT_IEEE_FLOAT and bits == 64:
+        return raw.view("<f8").reshape(n, -1)[:, :channels].astype(np.float32)
+    raise label_assets.WavError(f"Format WAV non supporté (format {fmt}, {bits} bits)")
+
+
+# -------------------------------------------------------------------
+# Filtres
+# -------------------------------------------------------------------
+
+def k_weighting_coeffs(rate: int):
+    """Biquads de pondération K (pré-filtre + RLB) pour n'importe quelle fréquence."""
+    # pré-filtre (shelf haut ~+4 dB)
+    f0 = 1681.974450955533
+    gain = 3.999843853973347
+    q = 0.7071752369554196
+    k = math.tan(math.pi * f0 / rate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = (
+        [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+        [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0],
+    )
+
+    # filtre RLB (passe-haut ~38 Hz)
+    f0 = 38.13547087602444
+    q = 0.5003270373238773
+    k = math.tan(math.pi * f0 / rate)
+    a0 = 1 + k / q + k * k
+    highpass = (
+        [1.0, -2.0, 1.0],
+        [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0],
+    )
+    return shelf, highpass
+
+
+def _biquad_impulse(coeffs, x):
+    b, a = coeffs
+    y = np.zeros_like(x)
+    x1 = x2 = y1 = y2 = 0.0
+    for i, xi in enumerate(x):
+        yi = b[0] * xi + b[1] * x1 + b[2] * x2 - a[1] * y1 - a[2] * y2
+        x2, x1 = x1, xi
+        y2, y1 = y1, yi
+        y[i] = yi
+    return y
+
+
+def k_weighting_impulse(rate: int):
+    """
+    Réponse impulsionnelle tronquée (100 ms) de la pondération K.
+    Les pôles décroissent en quelques ms : l'erreur de troncature est
+    bien en dessous de la précision 24 bits.
+    """
+    length = max(int(rate * 0.1), 64)
+    impulse = np.zeros(length)
+    impulse[0] = 1.0
+    shelf, highpass = k_weighting_coeffs(rate)
+    return _biquad_impulse(highpass, _biquad_impulse(shelf, impulse))
+
+
+def _oversampling_filter(factor: int, taps_per_phase: int = 12):
+    """FIR passe-bas (sinc fenêtré Kaiser) découpé en `factor` phases."""
+    taps = factor * taps_per_phase
+    n = np.arange(taps) - (taps - 1) / 2
+    h = np.sinc(n / factor) * np.kaiser(taps, 8.0)
+    h *= factor / h.sum()
+    # phase p : coefficients h[p], h[p + factor], ...
+    return h.reshape(taps_per_phase, factor).T
+
+
+def _fft_filter(ext, spectrum, nfft):
+    return np.fft.irfft(np.fft.rfft(ext, nfft, axis=0) * spectrum[:, None], nfft, axis=0)
+
+
+def _channel_weights(channels: int):
+    # 5.1 : L R C LFE Ls Rs -> LFE ignoré, surrounds +1.5 dB
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+# -------------------------------------------------------------------
+# Analyse
+# -------------------------------------------------------------------
+
+def _power_to_lufs(power):
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10 * np.log10(power)
+
+
+def analyze_wav(path: Path):
+    """
+    Analyse un WAV en streaming.
+    Retourne {"integrated_lufs", "loudness_range", "true_peak_dbtp",
+              "sample_peak_dbfs", "duration", "sample_rate", "bits", "channels"}.
+    """
+    info = label_assets.read_wav_info(path)
+    rate = info["sample_rate"]
+    channels = info["channels"]
+    frames = info["frames"]
+
+    segment = int(round(rate * 0.1))
+    chunk_frames = segment * 10 * CHUNK_SECONDS
+
+    impulse = k_weighting_impulse(rate)
+    history_len = len(impulse) - 1
+    nfft = 1 << int(math.ceil(math.log2(chunk_frames + 2 * history_len)))
+    spectrum = np.fft.rfft(impulse, nfft)
+
+    factor = 4 if rate < 96000 else (2 if rate < 192000 else 1)
+    phases = _oversampling_filter(factor) if factor > 1 else None
+    tp_history_len = phases.shape[1] - 1 if phases is not None else 0
+
+    weights = _channel_weights(channels)
+
+    raw = np.memmap(
+        path,
+        dtype=np.uint8,
+        mode="r",
+        offset=info["data_offset"],
+        shape=(frames, info["block_align"]),
+    ) if frames else np.zeros((0, info["block_align"]), dtype=np.uint8)
+
+    k_history = np.zeros((history_len, channels), dtype=np.float64)
+    tp_history = np.zeros((tp_history_len, channels), dtype=np.float32)
+    segment_power = []
+    leftover = np.zeros((0, channels))
+    sample_peak = 0.0
+    true_peak = 0.0
+
+    for start in range(0, frames, chunk_frames):
+        x = _decode(np.ascontiguousarray(raw[start:start + chunk_frames]), info)
+        n = x.shape[0]
+
+        if n:
+            sample_peak = max(sample_peak, float(np.abs(x).max()))
+
+        # --- true-peak : une convolution courte par phase et par canal
+        if phases is not None:
+            ext = np.concatenate([tp_history, x])
+            for p in range(factor):
+                kernel = phases[p]
+                for c in range(channels):
+                    y = np.convolve(ext[:, c], kernel, mode="valid")
+                    if y.size:
+                        true_peak = max(true_peak, float(np.abs(y).max()))
+            tp_history = ext[-tp_history_len:]
+
+        # --- pondération K (convolution FFT, historique entre morceaux)
+        ext = np.concatenate([k_history, x.astype(np.float64)])
+        y = _fft_filter(ext, spectrum, nfft)[history_len:history_len + n]
+        k_history = ext[-history_len:]
+
+        # --- énergie par tranche de 100 ms (tranche incomplète reportée)
+        y = np.concatenate([leftover, y])
+        full = (y.shape[0] // segment) * segment
+        if full:
+            blocks = y[:full].reshape(-1, segment, channels)
+            segment_power.append(((blocks ** 2).mean(axis=1) * weights).sum(axis=1))
+        leftover = y[full:]
+
+    powers = np.concatenate(segment_power) if segment_power else np.zeros(0)
+
+    true_peak = max(true_peak, sample_peak)
+    return {
+        "integrated_lufs": _integrated(powers),
+        "loudness_range": _loudness_range(powers),
+        "true_peak_dbtp": _to_db(true_peak),
+        "sample_peak_dbfs": _to_db(sample_peak),
+        "duration": round(info["duration"], 2),
+        "sample_rate": rate,
+        "bits": info["bits"],
+        "channels": channels,
+    }
+
+
+def _to_db(value):
+    if value <= 0:
+        return None
+    return round(20 * math.log10(value), 2)
+
+
+def _block_powers(powers, length, hop):
+    if powers.size < length:
+        return np.zeros(0)
+    sums = np.concatenate([[0.0], np.cumsum(powers)])
+    starts = np.arange(0, powers.size - length + 1, hop)
+    return (sums[starts + length] - sums[starts]) / length
+
+
+def _integrated(powers):
+    """Blocs de 400 ms, recouvrement 75 %, portes absolue puis relative."""
+    blocks = _block_powers(powers, 4, 1)
+    blocks = blocks[_power_to_lufs(blocks) > ABSOLUTE_GATE]
+    if not blocks.size:
+        return None
+    relative = _power_to_lufs(blocks.mean()) + RELATIVE_GATE
+    gated = blocks[_power_to_lufs(blocks) > relative]
+    if not gated.size:
+        return None
+    return round(float(_power_to_lufs(gated.mean())), 2)
+
+
+def _loudness_range(powers):
+    """Short-term 3 s toutes les secondes, LRA = P95 - P10 des blocs conservés."""
+    blocks = _block_powers(powers, 30, 10)
+    blocks = blocks[_power_to_lufs(blocks) > ABSOLUTE_GATE]
+    if not blocks.size:
+        return None
+    relative = _power_to_lufs(blocks.mean()) + LRA_RELATIVE_GATE
+    loudness = _power_to_lufs(blocks[_power_to_lufs(blocks) > relative])
+    if not loudness.size:
+        return None
+    low, high = np.percentile(loudness, [10, 95])
+    return round(float(high - low), 2)
+
+
+# -------------------------------------------------------------------
+# Comparaison avec la cible du genre
+# -------------------------------------------------------------------
+
+def parse_target(target: str):
+    """
+    "-9 à -8 LUFS (TP ≤ -1 dBTP)" -> (-9.0, -8.0, -1.0).
+    Retourne (None, None, TRUE_PEAK_CEILING) si rien n'est lisible.
+    """
+    numbers = [float(n.replace(",", ".")) for n in re.findall(r"[-+]?\d+(?:[.,]\d+)?", target or "")]
+    lufs_min = lufs_max = None
+    if len(numbers) >= 2:
+        lufs_min, lufs_max = sorted(numbers[:2])
+    elif len(numbers) == 1:
+        lufs_min = lufs_max = numbers[0]
+
+    tp_max = TRUE_PEAK_CEILING
+    if "dBTP" in (target or "") and len(numbers) >= 3:
+        tp_max = numbers[-1]
+    return lufs_min, lufs_max, tp_max
+
+
+def compare_to_target(result: dict, target: str):
+    """Ajoute à `result` la cible et un verdict lisible."""
+    lufs_min, lufs_max, tp_max = parse_target(target)
+    lufs = result.get("integrated_lufs")
+    tp = result.get("true_peak_dbtp")
+
+    verdicts = []
+    lufs_ok = None
+    if lufs is not None and lufs_min is not None:
+        if lufs > lufs_max:
+            lufs_ok = False
+            verdicts.append(f"trop fort de {lufs - lufs_max:.1f} LU")
+        elif lufs < lufs_min:
+            lufs_ok = False
+            verdicts.append(f"trop faible de {lufs_min - lufs:.1f} LU")
+        else:
+            lufs_ok = True
+
+    tp_ok = None
+    if tp is not None:
+        tp_ok = tp <= tp_max
+        if not tp_ok:
+            verdicts.append(f"true-peak {tp:+.1f} dBTP > {tp_max:+.1f} dBTP")
+
+    result = dict(result)
+    result.update(
+        target=target,
+        target_lufs_min=lufs_min,
+        target_lufs_max=lufs_max,
+        target_true_peak=tp_max,
+        lufs_ok=lufs_ok,
+        true_peak_ok=tp_ok,
+        verdict="Conforme à la cible" if not verdicts else "Hors cible : " + ", ".join(verdicts),
+    )
+    return result
+
+
+# -------------------------------------------------------------------
+# Master d'un projet
+# -------------------------------------------------------------------
+
+def analyze_project_master(project_path: Path, project: dict, wav_path: Path = None):
+    """
+    Analyse le master du projet (master.wav par défaut), le compare à
+    `master_lufs_target` et enregistre le résultat dans master_analysis.yaml.
+    """
+    wav_path = Path(wav_path or project_path / MASTER_FILE)
+    try:
+        result = analyze_wav(wav_path)
+    except (OSError, label_assets.WavError) as e:
+        result = {"error": str(e)}
+    else:
+        result = compare_to_target(result, project.get("master_lufs_target") or "")
+    result["file"] = wav_path.name
+    _write_analysis(project_path, result)
+    return result
+
+
+def _write_analysis(project_path: Path, result: dict):
+    path = project_path / ANALYSIS_FILE
+    tmp = path.with_name(ANALYSIS_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        yaml.safe_dump(result, f, allow_unicode=True, sort_keys=False)
+    os.replace(tmp, path)
+
+
+def analyze_in_background(project_path: Path):
+    """
+    Lance l'analyse du master dans le thread d'analyse (un seul : l'analyse
+    est limitée par le CPU). Un nouvel envoi pour le même projet remplace
+    l'analyse encore en attente. Les métadonnées (cible LUFS) sont relues
+    via le journal au moment de l'analyse.
+    """
+    import label_journal
+
+    global _executor
+    key = str(project_path)
+    with _jobs_lock:
+        generation = _jobs.get(key, 0) + 1
+        _jobs[key] = generation
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pulse-loudness")
+    _write_analysis(project_path, {"status": PENDING, "file": MASTER_FILE})
+
+    def job():
+        with _jobs_lock:
+            if _jobs.get(key) != generation:
+                return  # remplacée par un envoi plus récent
+        try:
+            analyze_project_master(project_path, label_journal.project_meta(project_path))
+        except Exception as e:
+            log.exception("analyse du master %s", project_path.name)
+            _write_analysis(project_path, {"error": str(e), "file": MASTER_FILE})
+        finally:
+            with _jobs_lock:
+                if _jobs.get(key) == generation:
+                    del _jobs[key]
+
+    _executor.submit(job)
+
+
+def load_project_analysis(project_path: Path):
+    path = project_path / ANALYSIS_FILE
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f)
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if data.get("status") == PENDING:
+        with _jobs_lock:
+            running = str(project_path) in _jobs
+        if not running:
+            # app fermée pendant l'analyse
+            return {"error": "analyse interrompue, renvoyez le fichier", "file": data.get("file")}
+    return data
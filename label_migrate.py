@@ -0,0 +1,372 @@
+"""
+Mise à jour des projets existants après une modification des modèles de plan
+(plan_template.yaml, plan_templates/ : voir label_plans).
+
+Chaque projet retient la version du modèle qui a généré sa checklist
+(`template_version` dans project.yaml, copie dans PROJECTS_DIR/_templates/).
+La différence entre cette version et le modèle actuel du projet (qui dépend
+de son type de sortie / genre) est calculée une seule fois par couple de
+versions, par `id` d'étape :
+  - étapes ajoutées / supprimées / renommées / déplacées (day_offset),
+  - tâches ajoutées / supprimées / renommées (même position dans l'étape).
+
+Puis chaque checklist est régénérée à partir du modèle actuel en conservant :
+  - les tâches cochées (y compris à travers un renommage),
+  - les options `[opt_*]` choisies dans project.yaml,
+  - les tâches et sections ajoutées à la main.
+
+Les projets sont traités en parallèle ; `dry_run` produit le rapport sans
+rien écrire.
+"""
+import difflib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import label_agent
+import label_journal
+import label_plans
+
+# Coches concurrentes tolérées sur un même projet avant d'abandonner sa migration
+MIGRATE_ATTEMPTS = 5
+
+
+# -------------------------------------------------------------------
+# Différence entre deux versions du modèle
+# -------------------------------------------------------------------
+
+def diff_templates(old_steps, new_steps):
+    """
+    Différence structurelle entre deux listes d'étapes, par id :
+      {"added": [id], "removed": [id], "renamed": {id: [ancien, nouveau]},
+       "moved": {id: [ancien offset, nouveau]},
+       "tasks": {id: {"added": [...], "removed": [...], "renamed": [[ancienne, nouvelle]]}}}
+    Les tâches sont comparées sur le texte brut du modèle (préfixes [opt_*] inclus).
+    """
+    old_by_id = {label_agent.step_key(s): s for s in old_steps}
+    new_by_id = {label_agent.step_key(s): s for s in new_steps}
+
+    diff = {
+        "added": [sid for sid in new_by_id if sid not in old_by_id],
+        "removed": [sid for sid in old_by_id if sid not in new_by_id],
+        "renamed": {},
+        "moved": {},
+        "tasks": {},
+    }
+
+    for sid, new in new_by_id.items():
+        old = old_by_id.get(sid)
+        if old is None:
+            continue
+        if old.get("title") != new.get("title"):
+            diff["renamed"][sid] = [old.get("title"), new.get("title")]
+        if old.get("day_offset") != new.get("day_offset"):
+            diff["moved"][sid] = [old.get("day_offset"), new.get("day_offset")]
+
+        old_tasks = [str(t) for t in old.get("tasks") or []]
+        new_tasks = [str(t) for t in new.get("tasks") or []]
+        if old_tasks == new_tasks:
+            continue
+
+        changes = {"added": [], "removed": [], "renamed": []}
+        matcher = difflib.SequenceMatcher(a=old_tasks, b=new_tasks, autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == "equal":
+                continue
+            if op == "replace" and i2 - i1 == j2 - j1:
+                changes["renamed"].extend([a, b] for a, b in zip(old_tasks[i1:i2], new_tasks[j1:j2]))
+                continue
+            changes["removed"].extend(old_tasks[i1:i2])
+            changes["added"].extend(new_tasks[j1:j2])
+        diff["tasks"][sid] = changes
+
+    return diff
+
+
+def is_empty_diff(diff):
+    return not any(diff[k] for k in ("added", "removed", "renamed", "moved", "tasks"))
+
+
+# -------------------------------------------------------------------
+# Migration d'un projet
+# -------------------------------------------------------------------
+
+def _match_by_tasks(tasks, known):
+    """
+    Ancienne checklist sans id dont la section a été renommée : étape du modèle
+    qui partage plus de la moitié des tâches, ou None.
+    """
+    texts = {t["text"] for t in tasks}
+    best, best_count = None, 0
+    for sid, template_texts in known.items():
+        count = len(texts & template_texts)
+        if count > best_count:
+            best, best_count = sid, count
+    if texts and best_count * 2 > len(texts):
+        return best
+    return None
+
+
+def _render_context(plan, old_plan, diff, project):
+    """Tâches connues du modèle et renommages pour ce projet."""
+    # ids des sections (marqueur, sinon titre dans l'ancien / le nouveau modèle)
+    titles_to_id = {}
+    for p in (plan, old_plan):
+        for step in (p or {}).get("steps", []):
+            titles_to_id[step["title"]] = step["id"]
+
+    known = label_plans.template_texts(plan, project)
+    if old_plan:
+        for sid, texts in label_plans.template_texts(old_plan, project).items():
+            known.setdefault(sid, set()).update(texts)
+
+    # renommages de tâches : textes rendus pour ce projet, ancien -> nouveau
+    renamed_tasks = {}
+    for sid, changes in (diff or {}).get("tasks", {}).items():
+        for old_raw, new_raw in changes["renamed"]:
+            old_texts = label_plans.expand_task(old_raw, project)
+            new_texts = label_plans.expand_task(new_raw, project)
+            for old_text, new_text in zip(old_texts, new_texts):
+                renamed_tasks[(sid, old_text)] = new_text
+
+    return {
+        "titles_to_id": titles_to_id,
+        "known": known,
+        "renamed_tasks": renamed_tasks,
+    }
+
+
+def migrate_project(project_path, plan, old_plan=None, diff=None, dry_run=False, cache=None):
+    """
+    Régénère la checklist d'un projet à partir du plan compilé `plan`
+    (label_plans). `old_plan` : version du modèle qui a généré la checklist
+    (si connue), `diff` : diff_templates(ancien, nouveau),
+    `cache` : dict partagé entre projets.
+    Retourne un rapport : {"slug", "from", "to", "changed", "conflict",
+    "sections_added", "sections_removed", "sections_renamed", "tasks_added",
+    "tasks_removed", "done_kept", "done_lost"}.
+
+    Si la checklist est modifiée pendant le calcul (coche depuis l'app), le
+    calcul est refait avec l'état à jour, au plus MIGRATE_ATTEMPTS fois ;
+    au-delà le projet est laissé tel quel ("conflict": True).
+    """
+    for _attempt in range(MIGRATE_ATTEMPTS):
+        report, written = _migrate_once(project_path, plan, old_plan, diff, dry_run, cache)
+        if written:
+            return report
+    report["changed"] = False
+    report["conflict"] = True
+    return report
+
+
+def _migrate_once(project_path, plan, old_plan, diff, dry_run, cache):
+    """Une tentative de migrate_project. Retourne (rapport, écrit ou rien à écrire)."""
+    text = label_journal.checklist_text(project_path)
+    meta = label_journal.project_meta(project_path)
+
+    cache = cache if cache is not None else {}
+    key = (plan["version"], old_plan["version"] if old_plan else None, label_plans.render_key(meta))
+    ctx = cache.get(key)
+    if ctx is None:
+        ctx = cache[key] = _render_context(plan, old_plan, diff, meta)
+    version = plan["version"]
+    known = ctx["known"]
+    renamed_tasks = ctx["renamed_tasks"]
+
+    report = {
+        "slug": project_path.name,
+        "from": meta.get("template_version") or label_agent.BASELINE_VERSION,
+        "to": version,
+        "changed": False,
+        "conflict": False,
+        "sections_added": [],
+        "sections_removed": [],
+        "sections_renamed": [],
+        "tasks_added": 0,
+        "tasks_removed": 0,
+        "done_kept": 0,
+        "done_lost": 0,
+    }
+
+    current = {}
+    custom = []
+    for sid, title, tasks in label_agent.iter_checklist_steps(text):
+        sid = sid or ctx["titles_to_id"].get(title) or _match_by_tasks(tasks, known)
+        if sid is None or sid in current:
+            custom.append((None, title, tasks))
+        else:
+            current[sid] = (title, tasks)
+
+    rendered = label_plans.render_sections(plan, meta)
+
+    # Tâches cochées des étapes qui n'existent plus (passage à un autre modèle,
+    # ex : plan_template.yaml -> ep.yaml) : reportées sur une tâche identique
+    # du nouveau modèle
+    new_ids = {sid for sid, _title, _tasks in rendered}
+    orphan_done = {
+        t["text"]
+        for sid, (_title, tasks) in current.items()
+        if sid not in new_ids
+        for t in tasks
+        if t["done"]
+    }
+    carried = set()
+
+    sections = []
+    for sid, title, plan_tasks in rendered:
+        tasks = [dict(t) for t in plan_tasks]
+        old = current.pop(sid, None)
+        if old is None:
+            report["sections_added"].append(title)
+            report["tasks_added"] += len(tasks)
+            for t in tasks:
+                if t["text"] in orphan_done and t["text"] not in carried:
+                    t["done"] = True
+                    carried.add(t["text"])
+                    report["done_kept"] += 1
+            sections.append((sid, title, tasks))
+            continue
+
+        old_title, old_tasks = old
+        if old_title != title:
+            report["sections_renamed"].append([old_title, title])
+
+        done = set()
+        for t in old_tasks:
+            if t["done"]:
+                done.add(renamed_tasks.get((sid, t["text"]), t["text"]))
+
+        new_texts = {t["text"] for t in tasks}
+        for t in tasks:
+            t["done"] = t["text"] in done
+            report["done_kept"] += t["done"]
+
+        old_texts = {renamed_tasks.get((sid, t["text"]), t["text"]) for t in old_tasks}
+        report["tasks_added"] += len(new_texts - old_texts)
+
+        for t in old_tasks:
+            mapped = renamed_tasks.get((sid, t["text"]), t["text"])
+            if mapped in new_texts:
+                continue
+            if t["text"] in known.get(sid, ()):
+                # tâche du modèle supprimée (ou option désactivée)
+                report["tasks_removed"] += 1
+                report["done_lost"] += t["done"]
+            else:
+                # tâche ajoutée à la main : conservée
+                tasks.append(t)
+        sections.append((sid, title, tasks))
+
+    # étapes disparues du modèle : on ne garde que les tâches ajoutées à la main
+    for sid, (title, tasks) in current.items():
+        kept = [t for t in tasks if t["text"] not in known.get(sid, ())]
+        removed = [t for t in tasks if t["text"] in known.get(sid, ())]
+        report["tasks_removed"] += len(removed)
+        report["done_lost"] += sum(t["done"] and t["text"] not in carried for t in removed)
+        if kept:
+            custom.append((sid, title, kept))
+        else:
+            report["sections_removed"].append(title)
+
+    new_text = label_agent.render_checklist(sections + custom)
+    report["changed"] = new_text != text or report["from"] != version
+
+    if report["changed"] and not dry_run:
+        new_meta = dict(meta)
+        new_meta["template_version"] = version
+        if not label_journal.rewrite(project_path, new_text, new_meta, expected=text):
+            # coche pendant la migration : à refaire avec l'état à jour
+            return report, False
+        label_agent.touch_catalog(project_path.name)
+
+    return report, True
+
+
+# -------------------------------------------------------------------
+# Migration du catalogue
+# -------------------------------------------------------------------
+
+def migrate_all(template=None, dry_run=False, workers=None):
+    """
+    Met tous les projets actifs à jour vers le modèle de leur type de sortie
+    (label_plans), ou vers `template` pour tous s'il est donné.
+    Retourne (diffs {(ancienne version, nouvelle): diff}, rapports par projet).
+    """
+    forced = label_plans.compile_template(template) if template else None
+
+    diffs = {}
+    saved = set()
+    cache = {}
+    lock = threading.Lock()
+
+    def context(plan, old_plan):
+        # un seul diff par couple de versions du modèle
+        with lock:
+            if not dry_run and plan["version"] not in saved:
+                label_agent.save_template_snapshot(plan["template"])
+                saved.add(plan["version"])
+            if old_plan["version"] == plan["version"]:
+                return None
+            key = (old_plan["version"], plan["version"])
+            if key not in diffs:
+                diffs[key] = diff_templates(old_plan["steps"], plan["steps"])
+            return diffs[key]
+
+    def job(project_path):
+        meta = label_journal.project_meta(project_path)
+        plan = forced or label_plans.plan_for(meta)
+        # plan qui a généré la checklist (copie de sa version, compilée une fois)
+        old_plan = label_plans.project_plan(meta)
+        diff = context(plan, old_plan)
+        return migrate_project(project_path, plan, old_plan, diff, dry_run=dry_run, cache=cache)
+
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reports = list(pool.map(job, label_agent.iter_project_dirs()))
+
+    return diffs, reports
+
+
+def format_report(diffs, reports, dry_run=False):
+    """Rapport texte (CLI) d'une migration."""
+    lines = []
+    for (old_version, new_version), diff in diffs.items():
+        lines.append(f"Modèle {old_version} → {new_version} :")
+        for sid in diff["added"]:
+            lines.append(f"  + étape {sid}")
+        for sid in diff["removed"]:
+            lines.append(f"  - étape {sid}")
+        for sid, (old, new) in diff["renamed"].items():
+            lines.append(f"  ~ étape {sid} renommée : « {old} » → « {new} »")
+        for sid, (old, new) in diff["moved"].items():
+            lines.append(f"  ~ étape {sid} déplacée : J{old} → J{new}")
+        for sid, changes in diff["tasks"].items():
+            lines.append(
+                f"  ~ étape {sid} : +{len(changes['added'])} / -{len(changes['removed'])} "
+                f"tâche(s), {len(changes['renamed'])} renommée(s)"
+            )
+        if is_empty_diff(diff):
+            lines.append("  (aucune différence)")
+
+    changed = [r for r in reports if r["changed"]]
+    for r in changed:
+        details = []
+        if r["sections_added"]:
+            details.append(f"+{len(r['sections_added'])} section(s)")
+        if r["sections_removed"]:
+            details.append(f"-{len(r['sections_removed'])} section(s)")
+        if r["sections_renamed"]:
+            details.append(f"{len(r['sections_renamed'])} renommée(s)")
+        details.append(f"+{r['tasks_added']} / -{r['tasks_removed']} tâche(s)")
+        details.append(f"{r['done_kept']} cochée(s) conservée(s)")
+        if r["done_lost"]:
+            details.append(f"⚠ {r['done_lost']} cochée(s) supprimée(s) du modèle")
+        lines.append(f" - {r['slug']} ({r['from']}) : " + ", ".join(details))
+
+    for r in reports:
+        if r["conflict"]:
+            lines.append(f" ⚠ {r['slug']} : modifié pendant la migration, non mis à jour (relancer)")
+
+    verb = "à mettre à jour" if dry_run else "mis à jour"
+    lines.append(f"{len(changed)} projet(s) {verb} sur {len(reports)}.")
+    return "\n".join(lines)
@@ -0,0 +1,288 @@
+"""
+Modèles de plan de sortie : un par type de sortie et / ou par genre.
+
+Le modèle d'un projet est cherché dans `plan_templates/`, du plus précis au
+plus général (noms en slug) :
+  1. <release_type>-<genre>.yaml   (ex : album-synthwave.yaml)
+  2. <release_type>.yaml           (ex : ep.yaml, album.yaml)
+  3. <genre>.yaml                  (ex : lofi.yaml)
+  4. plan_template.yaml            (modèle par défaut)
+
+Chaque fichier est compilé une seule fois (tant qu'il ne change pas) : ids
+d'étapes et de tâches, options `[opt_*]`, tâches `[per_track]`, offsets min /
+max, index par id et par titre. Le rendu d'une checklist est ensuite mis en
+cache par jeu d'options / cible LUFS / liste de pistes : générer la checklist
+d'un album de 20 titres ne coûte pas plus que celle d'un single.
+
+Chaque modèle a ses propres ids d'étapes (ex : `ep-j35`, `album-j56`) :
+la migration apparie les étapes par id, deux modèles ne doivent donc pas
+réutiliser un même id pour des étapes différentes.
+
+Un projet est lu (offsets, échéances, exports) avec le plan qui a généré sa
+checklist : la copie de sa `template_version` (project_plan), tant qu'il n'a
+pas été migré vers le modèle de son type de sortie (plan_for).
+
+Préfixes de tâches (cumulables) :
+  [opt_xxx]    tâche incluse seulement si project.yaml a `use_xxx: true`
+  [per_track]  tâche répétée pour chaque piste de `tracks` ({track} = nom)
+"""
+import re
+import threading
+from pathlib import Path
+
+import yaml
+from slugify import slugify
+
+import label_agent
+
+TEMPLATES_DIR = label_agent.ROOT / "plan_templates"
+
+# Nombre de rendus de checklist gardés en mémoire
+RENDER_CACHE_SIZE = 256
+
+_PREFIX_RE = re.compile(r"^\[(\w+)\]\s*")
+
+_lock = threading.Lock()
+_compiled = {}
+_rendered = {}
+_snapshots = {}
+
+
+# -------------------------------------------------------------------
+# Registre
+# -------------------------------------------------------------------
+
+def template_path(release_type=None, genre=None) -> Path:
+    """Fichier de modèle le plus précis pour ce type de sortie / genre."""
+    rt = slugify(release_type or "")
+    g = slugify(genre or "")
+    candidates = []
+    if rt and g:
+        candidates.append(f"{rt}-{g}")
+    if rt:
+        candidates.append(rt)
+    if g:
+        candidates.append(g)
+
+    for name in candidates:
+        path = TEMPLATES_DIR / f"{name}.yaml"
+        if path.exists():
+            return path
+    return label_agent.TEMPLATE_FILE
+
+
+def registry_key():
+    """Tailles / dates de tous les modèles (pour l'ETag des exports)."""
+    paths = [label_agent.TEMPLATE_FILE]
+    if TEMPLATES_DIR.is_dir():
+        paths.extend(sorted(TEMPLATES_DIR.glob("*.yaml")))
+    key = []
+    for path in paths:
+        try:
+            st = path.stat()
+            key.append(f"{path.name}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            continue
+    return "|".join(key)
+
+
+# -------------------------------------------------------------------
+# Compilation
+# -------------------------------------------------------------------
+
+def _compile_task(sid, index, raw):
+    text = str(raw)
+    option = None
+    per_track = False
+    while True:
+        m = _PREFIX_RE.match(text)
+        if not m:
+            break
+        tag = m.group(1)
+        if tag == "per_track":
+            per_track = True
+        elif tag.startswith("opt_"):
+            option = "use_" + tag[len("opt_"):]
+        else:
+            break
+        text = text[m.end():]
+
+    return {
+        "id": f"{sid}.{index}",
+        "raw": str(raw),
+        "text": text.strip(),
+        "option": option,
+        "per_track": per_track,
+        "master": text.startswith("Masteriser"),
+    }
+
+
+def compile_template(template):
+    """
+    Plan compilé d'un modèle (dict `release_plan`) :
+      {"version", "template", "steps", "by_offset", "index", "min_offset", "max_offset"}
+    Chaque étape garde les clés du YAML (id, title, day_offset, tasks) et
+    ajoute "items" : les tâches compilées.
+    """
+    steps = []
+    for step in template.get("release_plan", []):
+        sid = label_agent.step_key(step)
+        raw_tasks = step.get("tasks") or []
+        compiled = dict(step)
+        compiled["id"] = sid
+        compiled["tasks"] = raw_tasks
+        compiled["items"] = [_compile_task(sid, i, raw) for i, raw in enumerate(raw_tasks, start=1)]
+        steps.append(compiled)
+
+    index = {}
+    for step in steps:
+        index[step.get("title")] = step
+    for step in steps:
+        index[step["id"]] = step
+
+    dated = [s for s in steps if s.get("day_offset") is not None]
+    offsets = [s["day_offset"] for s in dated]
+    return {
+        "version": label_agent.template_version(template),
+        "template": template,
+        "steps": steps,
+        "by_offset": sorted(dated, key=lambda s: s["day_offset"]),
+        "index": index,
+        "min_offset": min(offsets) if offsets else None,
+        "max_offset": max(offsets) if offsets else None,
+    }
+
+
+def _read_template(path: Path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    except Exception:
+        return {"release_plan": []}
+    if not isinstance(data, dict) or not isinstance(data.get("release_plan"), list):
+        return {"release_plan": []}
+    return data
+
+
+def load_plan(path: Path):
+    """Plan compilé d'un fichier de modèle (recompilé seulement s'il change)."""
+    try:
+        st = path.stat()
+        key = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        key = None
+
+    with _lock:
+        cached = _compiled.get(str(path))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    plan = compile_template(_read_template(path) if key else {"release_plan": []})
+    with _lock:
+        _compiled[str(path)] = (key, plan)
+    return plan
+
+
+def plan_for(project):
+    """Plan compilé à utiliser pour ce projet (release_type / genre de project.yaml)."""
+    return load_plan(template_path(project.get("release_type"), project.get("genre")))
+
+
+def project_plan(project):
+    """
+    Plan compilé qui a généré la checklist du projet : copie de sa
+    `template_version` (PROJECTS_DIR/_templates/). Sans version (projet
+    antérieur aux modèles versionnés) : version "0", le plan_template.yaml
+    d'origine. Copie introuvable : plan_for.
+    """
+    version = project.get("template_version") or label_agent.BASELINE_VERSION
+    with _lock:
+        plan = _snapshots.get(version)
+    if plan is None:
+        # une version ne change jamais de contenu : compilée une seule fois
+        template = label_agent.load_template_snapshot(version)
+        plan = compile_template(template) if template else False
+        with _lock:
+            _snapshots[version] = plan
+    return plan or plan_for(project)
+
+
+# -------------------------------------------------------------------
+# Rendu
+# -------------------------------------------------------------------
+
+def project_tracks(project):
+    """Pistes du projet (`tracks` dans project.yaml), sinon le titre seul."""
+    tracks = project.get("tracks")
+    if isinstance(tracks, list):
+        names = [str(t).strip() for t in tracks if str(t).strip()]
+        if names:
+            return names
+    return [str(project.get("title") or "Titre")]
+
+
+def render_key(project):
+    """Ce qui change le rendu des tâches : cible LUFS du genre, options et pistes."""
+    lufs_range = label_agent.get_genre_config(project.get("genre"))["master_lufs"]
+    options = tuple(sorted(k for k, v in project.items() if k.startswith("use_") and v))
+    return lufs_range, options, tuple(project_tracks(project))
+
+
+def _expand(item, project, lufs_range, tracks, ignore_options):
+    """[(id, texte)] d'une tâche compilée pour ce projet."""
+    if item["option"] and not ignore_options and not project.get(item["option"]):
+        return []
+
+    text = item["text"]
+    if item["master"] and lufs_range:
+        text = f"{text} ({lufs_range}, TP ≤ -1 dBTP)"
+
+    if not item["per_track"]:
+        return [(item["id"], text)]
+    return [
+        (f"{item['id']}.t{n}", text.replace("{track}", name))
+        for n, name in enumerate(tracks, start=1)
+    ]
+
+
+def render_sections(plan, project, ignore_options=False):
+    """
+    Sections de la checklist d'un projet :
+      [(id, titre, [{"id", "text", "done": False}, ...]), ...]
+    Résultat partagé (cache) : le copier avant de le modifier.
+    """
+    key = (plan["version"], ignore_options, render_key(project))
+    with _lock:
+        sections = _rendered.get(key)
+    if sections is not None:
+        return sections
+
+    lufs_range, _options, tracks = key[2]
+    sections = []
+    for step in plan["steps"]:
+        tasks = []
+        for item in step["items"]:
+            for tid, text in _expand(item, project, lufs_range, tracks, ignore_options):
+                tasks.append({"id": tid, "text": text, "done": False})
+        sections.append((step["id"], step["title"], tasks))
+
+    with _lock:
+        if len(_rendered) >= RENDER_CACHE_SIZE:
+            _rendered.clear()
+        _rendered[key] = sections
+    return sections
+
+
+def template_texts(plan, project):
+    """{id d'étape: {textes des tâches}} pour ce projet, options ignorées."""
+    return {
+        sid: {t["text"] for t in tasks}
+        for sid, _title, tasks in render_sections(plan, project, ignore_options=True)
+    }
+
+
+def expand_task(raw, project):
+    """Textes d'une tâche brute du modèle pour ce projet (une par piste si [per_track])."""
+    item = _compile_task("", 0, raw)
+    lufs_range, _options, tracks = render_key(project)
+    return [text for _tid, text in _expand(item, project, lufs_range, tracks, ignore_options=True)]
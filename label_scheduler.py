@@ -0,0 +1,264 @@
+"""
+Rappels des deadlines en tâche de fond.
+
+Un thread garde un tas (min-heap) contenant, pour chaque projet, la prochaine
+section datée qui a encore des tâches à faire. Il dort jusqu'à l'échéance la
+plus proche (Condition.wait) : aucun parcours périodique du catalogue.
+
+Le catalogue n'est lu entièrement qu'au démarrage. Ensuite, chaque
+modification d'un projet (label_agent.touch_catalog) marque seulement ce
+projet à recalculer ; l'ancienne entrée du tas est invalidée paresseusement
+(et le tas reconstruit quand les entrées périmées dominent).
+
+Seuls les rappels échus après le dernier passage sont envoyés : ce repère
+(`since`) est gardé dans `_reminders.json`. Au tout premier démarrage, c'est
+l'heure de démarrage : les échéances déjà passées ne partent pas toutes
+d'un coup.
+
+A l'échéance, les rappels sont ajoutés à `_reminders.md` (digest lisible)
+et affichés en notification système si `plyer` est installé.
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+from datetime import datetime, time
+
+import label_agent
+import label_export
+
+# Heure locale à laquelle une section arrive à échéance
+REMINDER_HOUR = 9
+
+DIGEST_FILE = "_reminders.md"
+STATE_FILE = "_reminders.json"
+
+# Réveil de sécurité (changement d'heure, mise en veille) : pas de relecture
+MAX_SLEEP_SECONDS = 3600
+
+log = logging.getLogger(__name__)
+
+
+def notify_desktop(title, message):
+    """Notification système, si plyer est disponible (dépendance optionnelle)."""
+    try:
+        from plyer import notification
+    except ImportError:
+        return
+    try:
+        notification.notify(title=title, message=message, app_name="PULSE", timeout=10)
+    except Exception:
+        log.warning("notification système impossible", exc_info=True)
+
+
+class ReminderScheduler(threading.Thread):
+
+    def __init__(self, notify=notify_desktop):
+        super().__init__(name="pulse-reminders", daemon=True)
+        self.notify = notify
+        self._heap = []
+        # entrée vivante par projet : {slug: (échéance, jeton, section)}
+        self._entries = {}
+        self._counter = itertools.count()
+        self._dirty = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._since = self._load_since()
+
+    # ---------------------------------------------------------------
+    # API
+    # ---------------------------------------------------------------
+
+    def project_changed(self, slug):
+        """Appelé par label_agent.touch_catalog : recalcul du seul projet modifié."""
+        if slug is None:
+            return
+        with self._cond:
+            self._dirty.add(slug)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def next_due(self):
+        """(échéance, slug, section) la plus proche, ou None."""
+        with self._cond:
+            if not self._entries:
+                return None
+            slug, (due, _token, step_key) = min(self._entries.items(), key=lambda item: item[1][0])
+            return due, slug, step_key
+
+    # ---------------------------------------------------------------
+    # Boucle
+    # ---------------------------------------------------------------
+
+    def run(self):
+        if self._since is None:
+            self._since = datetime.now()
+            self._save_state()
+        for project_path in label_agent.iter_project_dirs():
+            self._schedule(project_path.name)
+
+        while True:
+            with self._cond:
+                while not self._stopped and not self._dirty:
+                    timeout = self._seconds_until_next()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                dirty, self._dirty = self._dirty, set()
+
+            try:
+                for slug in dirty:
+                    self._schedule(slug)
+                self._fire_due()
+            except Exception:
+                # un projet illisible ne doit pas arrêter les rappels
+                log.exception("rappels des deadlines")
+
+    def _seconds_until_next(self):
+        if not self._heap:
+            return MAX_SLEEP_SECONDS
+        delay = (self._heap[0][0] - datetime.now()).total_seconds()
+        return min(delay, MAX_SLEEP_SECONDS)
+
+    # ---------------------------------------------------------------
+    # Tas
+    # ---------------------------------------------------------------
+
+    def _schedule(self, slug):
+        """Calcule la prochaine section à rappeler pour `slug` et l'empile."""
+        project_path = label_agent.project_dir(slug)
+        entry = None
+        if (project_path / "project.yaml").exists():
+            events = sorted(
+                label_export.iter_project_events(project_path),
+                key=lambda e: e["day_offset"],
+            )
+            for ev in events:
+                if ev["open_tasks"] and self._pending(ev):
+                    entry = ev
+                    break
+
+        with self._cond:
+            if entry is None:
+                self._entries.pop(slug, None)
+                return
+            due, step_key = self._due(entry), self._key(entry)
+            current = self._entries.get(slug)
+            if current is not None and (current[0], current[2]) == (due, step_key):
+                return  # échéance inchangée : l'entrée du tas reste valide
+            token = next(self._counter)
+            self._entries[slug] = (due, token, step_key)
+            heapq.heappush(self._heap, (due, token, slug, step_key))
+            if len(self._heap) > 3 * len(self._entries):
+                self._rebuild()
+            self._cond.notify()
+
+    def _rebuild(self):
+        """Tas reconstruit avec les seules entrées vivantes (plus de 2x périmées)."""
+        self._heap = [(due, token, slug, step_key) for slug, (due, token, step_key) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    @staticmethod
+    def _due(ev):
+        return datetime.combine(ev["date"], time(REMINDER_HOUR))
+
+    def _pending(self, ev):
+        """Rappel pas encore envoyé : échu après le dernier passage."""
+        return self._due(ev) > self._since
+
+    @staticmethod
+    def _key(ev):
+        return f"{ev['slug']}|{ev['step_id']}|{ev['date'].isoformat()}"
+
+    def _fire_due(self):
+        now = datetime.now()
+        due_slugs = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _due, token, slug, _step_key = heapq.heappop(self._heap)
+                current = self._entries.get(slug)
+                if current is None or current[1] != token:
+                    continue  # entrée périmée (projet modifié depuis)
+                del self._entries[slug]
+                due_slugs.append(slug)
+
+        if not due_slugs:
+            return
+
+        reminders = []
+        for slug in due_slugs:
+            project_path = label_agent.project_dir(slug)
+            for ev in label_export.iter_project_events(project_path):
+                if ev["open_tasks"] and self._pending(ev) and self._due(ev) <= now:
+                    reminders.append(ev)
+
+        # tout ce qui était échu est traité : les autres entrées du tas
+        # tombent après `now`
+        self._since = now
+        self._save_state()
+
+        if reminders:
+            self._write_digest(reminders, now)
+            if len(reminders) == 1:
+                ev = reminders[0]
+                self.notify(f"PULSE · {ev['title']}", f"{ev['step_title']} : {len(ev['open_tasks'])} tâche(s) restante(s)")
+            else:
+                self.notify("PULSE", f"{len(reminders)} deadlines à traiter (voir {DIGEST_FILE})")
+
+        for slug in due_slugs:
+            self._schedule(slug)
+
+    # ---------------------------------------------------------------
+    # Fichiers
+    # ---------------------------------------------------------------
+
+    def _write_digest(self, reminders, now):
+        lines = [f"\n## {now:%Y-%m-%d %H:%M}\n"]
+        for ev in sorted(reminders, key=lambda e: e["date"]):
+            offset = ev["day_offset"]
+            lines.append(
+                f"- **{ev['title']}** ({ev['artist']}) — {ev['step_title']} "
+                f"(J{'+' if offset > 0 else ''}{offset}, {ev['date'].isoformat()})"
+            )
+            lines.extend(f"  - [ ] {t}" for t in ev["open_tasks"])
+        path = label_agent.PROJECTS_DIR / DIGEST_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _load_since(self):
+        """Repère `since` enregistré, ou None au premier démarrage."""
+        path = label_agent.PROJECTS_DIR / STATE_FILE
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return datetime.fromisoformat(data["since"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_state(self):
+        path = label_agent.PROJECTS_DIR / STATE_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(STATE_FILE + ".tmp")
+        tmp.write_text(json.dumps({"since": self._since.isoformat(timespec="seconds")}), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+_scheduler = None
+
+
+def start(notify=notify_desktop):
+    """Démarre le thread de rappels (une seule fois par process)."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ReminderScheduler(notify=notify)
+        label_agent.on_catalog_change(_scheduler.project_changed)
+        _scheduler.start()
+    return _scheduler
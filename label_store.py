@@ -0,0 +1,317 @@
+"""
+Stockage des fichiers par contenu (masters, covers, teasers...).
+
+Chaque fichier est stocké une seule fois dans `PROJECTS_DIR/_assets/<sha256>`,
+quel que soit le nombre de projets (single, EP, deluxe) qui l'utilisent.
+Les projets y font référence dans `assets.yaml` ({chemin relatif: sha256})
+et reçoivent un lien physique (ou un reflink / une copie noyau à défaut)
+à l'emplacement attendu, sans passer par la mémoire Python.
+
+Les envois sont hashés au fil de l'eau pendant l'écriture du fichier
+temporaire. Un compteur de références par blob (`_assets/refs.json`) permet
+de supprimer un blob quand plus aucun projet ne l'utilise. Les modifications
+du store (blob, lien, manifeste, compteur) se font sous un verrou de fichier
+(`_assets/refs.lock`) partagé entre l'app, le démon et la CLI.
+
+Attention : un lien physique partage le fichier. Modifier un asset "en
+place" dans un projet modifie le blob ; les logiciels qui réenregistrent
+dans un nouveau fichier (cas courant) ne posent pas de problème.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import yaml
+
+import label_agent
+
+STORE_DIRNAME = "_assets"
+REFS_FILE = "refs.json"
+LOCK_FILE = "refs.lock"
+MANIFEST_FILE = "assets.yaml"
+
+# Taille des blocs lus / hashés pendant un envoi
+CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.RLock()
+_file_lock = {"depth": 0, "file": None}
+
+
+def store_dir() -> Path:
+    return label_agent.PROJECTS_DIR / STORE_DIRNAME
+
+
+def blob_path(digest: str) -> Path:
+    return store_dir() / digest[:2] / digest
+
+
+# -------------------------------------------------------------------
+# Verrou
+# -------------------------------------------------------------------
+
+@contextmanager
+def _locked():
+    """
+    Verrou du store : RLock entre threads + flock entre process (réentrant,
+    le fichier n'est verrouillé qu'au premier niveau). Sans fcntl (Windows),
+    seul le verrou du process s'applique.
+    """
+    with _lock:
+        if _file_lock["depth"] == 0:
+            path = store_dir() / LOCK_FILE
+            path.parent.mkdir(parents=True, exist_ok=True)
+            f = open(path, "a+b")
+            try:
+                import fcntl
+            except ImportError:
+                pass
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            _file_lock["file"] = f
+        _file_lock["depth"] += 1
+        try:
+            yield
+        finally:
+            _file_lock["depth"] -= 1
+            if _file_lock["depth"] == 0:
+                # fermer le fichier libère le flock
+                _file_lock["file"].close()
+                _file_lock["file"] = None
+
+
+# -------------------------------------------------------------------
+# Références
+# -------------------------------------------------------------------
+
+def _load_refs():
+    path = store_dir() / REFS_FILE
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_refs(refs):
+    path = store_dir() / REFS_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(REFS_FILE + ".tmp")
+    tmp.write_text(json.dumps(refs), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _change_refs(increments: dict):
+    """
+    Applique {hash: +n/-n} et supprime les blobs qui tombent à zéro.
+    Un hash absent de refs.json n'est jamais supprimé ici (compteur perdu
+    ou pas encore écrit) : gc() recompte depuis les manifestes.
+    """
+    if not increments:
+        return
+    with _locked():
+        refs = _load_refs()
+        for digest, delta in increments.items():
+            if digest not in refs:
+                if delta > 0:
+                    refs[digest] = delta
+                continue
+            count = refs[digest] + delta
+            if count > 0:
+                refs[digest] = count
+                continue
+            del refs[digest]
+            try:
+                blob_path(digest).unlink()
+            except OSError:
+                pass
+        _save_refs(refs)
+
+
+def load_manifest(project_path: Path) -> dict:
+    path = project_path / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_manifest(project_path: Path, manifest: dict):
+    with open(project_path / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        yaml.safe_dump(manifest, f, allow_unicode=True)
+
+
+# -------------------------------------------------------------------
+# Ecriture
+# -------------------------------------------------------------------
+
+def _receive(stream, chunk_size: int = CHUNK_SIZE):
+    """
+    Copie `stream` dans un fichier temporaire du store en le hashant au fil
+    de la lecture (hors verrou : un envoi peut durer). Retourne (tmp, sha256, taille).
+    """
+    tmp_dir = store_dir() / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_dir / uuid.uuid4().hex
+
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, "wb") as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+    return tmp, h.hexdigest(), size
+
+
+def _commit_blob(tmp: Path, digest: str):
+    """Range le fichier reçu sous son hash (à appeler sous _locked())."""
+    target = blob_path(digest)
+    if target.exists():
+        tmp.unlink()
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, target)
+
+
+def ingest(stream, chunk_size: int = CHUNK_SIZE):
+    """
+    Copie `stream` dans le store en le hashant au fil de la lecture.
+    Retourne (sha256, taille). Un contenu déjà présent n'est pas dupliqué.
+    Le blob n'est pas référencé : gc() le supprime s'il n'entre dans aucun
+    manifeste (add_to_project fait les deux d'un seul tenant).
+    """
+    tmp, digest, size = _receive(stream, chunk_size)
+    try:
+        with _locked():
+            _commit_blob(tmp, digest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return digest, size
+
+
+def _reflink(src: Path, dest: Path) -> bool:
+    """Clone copy-on-write (Btrfs, XFS...) via l'ioctl FICLONE de Linux."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    FICLONE = 0x40049409
+    try:
+        with open(src, "rb") as s, open(dest, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        try:
+            dest.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def place(digest: str, dest: Path):
+    """Fait apparaître le blob en `dest` : lien physique, sinon reflink, sinon copie noyau."""
+    src = blob_path(digest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists() or dest.is_symlink():
+        dest.unlink()
+    try:
+        os.link(src, dest)
+        return
+    except OSError:
+        pass
+    if _reflink(src, dest):
+        return
+    # copyfile passe par sendfile / fcopyfile quand c'est possible
+    shutil.copyfile(src, dest)
+
+
+def add_to_project(project_path: Path, rel_path: str, stream):
+    """
+    Ajoute un fichier à un projet via le store.
+    Retourne (sha256, taille). Le blob est rangé, lié, inscrit au manifeste
+    et compté sous le même verrou : un _change_refs ou un gc concurrent ne
+    peut pas le supprimer entre-temps.
+    """
+    tmp, digest, size = _receive(stream)
+    try:
+        with _locked():
+            _commit_blob(tmp, digest)
+            manifest = load_manifest(project_path)
+            previous = manifest.get(rel_path)
+            place(digest, project_path / rel_path)
+            manifest[rel_path] = digest
+            _save_manifest(project_path, manifest)
+
+            increments = {digest: 1}
+            if previous:
+                increments[previous] = increments.get(previous, 0) - 1
+            _change_refs(increments)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return digest, size
+
+
+def relink_project(project_path: Path):
+    """Recrée les fichiers d'un projet à partir du manifeste (ex : après désarchivage)."""
+    with _locked():
+        for rel_path, digest in load_manifest(project_path).items():
+            dest = project_path / rel_path
+            if not dest.exists() and blob_path(digest).exists():
+                place(digest, dest)
+
+
+def release_manifest(manifest: dict):
+    """Libère les références d'un manifeste (suppression d'un projet)."""
+    increments = {}
+    for digest in manifest.values():
+        increments[digest] = increments.get(digest, 0) - 1
+    _change_refs(increments)
+
+
+def release_project(project_path: Path):
+    release_manifest(load_manifest(project_path))
+
+
+def gc(extra_manifests=()):
+    """
+    Recompte les références depuis les manifestes de tous les projets actifs
+    (+ `extra_manifests`, ex : projets archivés) et supprime les blobs orphelins.
+    """
+    with _locked():
+        refs = {}
+        manifests = [load_manifest(p) for p in label_agent.iter_project_dirs()]
+        for manifest in list(manifests) + list(extra_manifests):
+            for digest in manifest.values():
+                refs[digest] = refs.get(digest, 0) + 1
+
+        removed = 0
+        root = store_dir()
+        if root.is_dir():
+            for shard in root.iterdir():
+                if not shard.is_dir() or shard.name == "tmp":
+                    continue
+                for blob in shard.iterdir():
+                    if blob.name not in refs:
+                        blob.unlink()
+                        removed += 1
+        _save_refs(refs)
+        return removed
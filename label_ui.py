@@ -1,15 +1,28 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context
 from pathlib import Path
 from datetime import datetime, timedelta
 from slugify import slugify
+from werkzeug.utils import secure_filename
 import yaml
 import label_agent
+import label_journal
+import label_export
+import label_archive
+import label_loudness
+import label_assets
+import label_store
+import label_plans
+import label_logging
+import logging
 import os
 import requests
 import sys
 
 
 app = Flask(__name__)
+label_logging.init_app(app)
+
+log = logging.getLogger(__name__)
 
 # Dossier de l'app (templates, plan_template.yaml)
 if getattr(sys, "frozen", False):
@@ -25,7 +38,6 @@ if getattr(sys, "frozen", False):
 else:
     PROJECTS_DIR = ROOT / "projects"
 
-TEMPLATE_FILE = ROOT / "plan_template.yaml"
 
 SETTINGS_FILE = PROJECTS_DIR / "settings.yaml"
 
@@ -118,13 +130,13 @@ def format_days(delta: int):
 
 def get_next_deadline(project_slug: str):
     """Calcule la prochaine étape à venir depuis le modèle YAML (par offset J-xx)"""
-    project_path = PROJECTS_DIR / project_slug
+    project_path = label_agent.project_dir(project_slug)
     project_yaml = project_path / "project.yaml"
 
     if not project_yaml.exists():
         return None, None, None
 
-    project = load_yaml(project_yaml)
+    project = label_journal.project_meta(project_path)
     release_date_str = project.get("release_date")
     if not release_date_str:
         return None, None, None
@@ -137,12 +149,8 @@ def get_next_deadline(project_slug: str):
     today = datetime.now().date()
     today_offset = (today - release_date).days
 
-    template = load_yaml(TEMPLATE_FILE)
-    steps = template.get("release_plan", [])
-    steps = sorted(steps, key=lambda s: s["day_offset"])
-
     next_step = None
-    for step in steps:
+    for step in label_plans.project_plan(project)["by_offset"]:
         if step["day_offset"] >= today_offset:
             next_step = step
             break
@@ -163,7 +171,7 @@ def load_checklist_status(path: Path):
     if not path.exists():
         return status
 
-    lines = path.read_text(encoding="utf-8").splitlines()
+    lines = label_journal.checklist_text(path.parent).splitlines()
     for line in lines:
         stripped = line.strip()
         if stripped.startswith("- [ ]") or stripped.startswith("- [x]"):
@@ -173,13 +181,14 @@ def load_checklist_status(path: Path):
     return status
 
 
-def parse_checklist_sections(checklist_path: Path, template_path: Path):
+def parse_checklist_sections(checklist_path: Path, plan: dict):
     """
-    Parse checklist.md en sections avec offset.
+    Parse checklist.md en sections avec offset (plan compilé : label_plans).
 
     Retourne:
       sections: [
         {
+          "id": "j35" (ou None),
           "title": "...",
           "offset": -35,
           "pos": 0-100 (optionnel),
@@ -193,28 +202,17 @@ def parse_checklist_sections(checklist_path: Path, template_path: Path):
     if not checklist_path.exists():
         return [], None, None
 
-    template = load_yaml(template_path)
-    steps = template.get("release_plan", [])
-    offsets_by_title = {step["title"]: step.get("day_offset") for step in steps}
-    offset_values = [o for o in offsets_by_title.values() if o is not None]
-
-    if offset_values:
-        min_offset = min(offset_values)
-        max_offset = max(offset_values)
-    else:
-        min_offset = max_offset = None
+    steps = plan["index"]
+    min_offset = plan["min_offset"]
+    max_offset = plan["max_offset"]
 
-    lines = checklist_path.read_text(encoding="utf-8").splitlines()
+    text = label_journal.checklist_text(checklist_path.parent)
 
     sections = []
-    current_title = None
-    current_tasks = []
-
-    def add_section():
-        nonlocal current_title, current_tasks
-        if current_title is None:
-            return
-        offset = offsets_by_title.get(current_title)
+    for sid, title, tasks in label_agent.iter_checklist_steps(text):
+        # par id (section renommée) ; anciennes checklists sans id : par titre
+        step = steps.get(sid) if sid else steps.get(title)
+        offset = step.get("day_offset") if step else None
         pos = None
         if (
             min_offset is not None
@@ -224,35 +222,19 @@ def parse_checklist_sections(checklist_path: Path, template_path: Path):
         ):
             pos = int(round((offset - min_offset) / (max_offset - min_offset) * 100))
 
-        all_done = bool(current_tasks) and all(t["done"] for t in current_tasks)
+        all_done = bool(tasks) and all(t["done"] for t in tasks)
 
         sections.append(
             {
-                "title": current_title,
+                "id": step["id"] if step else sid,
+                "title": title,
                 "offset": offset,
                 "pos": pos,
-                "tasks": current_tasks,
+                "tasks": tasks,
                 "all_done": all_done,
             }
         )
 
-    for line in lines:
-        stripped = line.strip()
-
-        if stripped.startswith("### "):
-            add_section()
-            current_title = stripped[4:].strip()
-            current_tasks = []
-            continue
-
-        if stripped.startswith("- [ ]") or stripped.startswith("- [x]"):
-            if current_title is None:
-                continue
-            done = stripped.startswith("- [x]")
-            text = stripped[5:].strip()
-            current_tasks.append({"text": text, "done": done})
-    add_section()
-
     return sections, min_offset, max_offset
 
 app.jinja_env.globals.update(
@@ -312,53 +294,61 @@ def build_project_context_yaml(project: dict, extra_notes: str | None = None) ->
 # -------------------------------------------------------------------
 
 
+def project_card(slug: str, data: dict, today, archived=False):
+    """Infos d'un projet pour la liste du tableau de bord."""
+    release_str = data.get("release_date")
+    release_display = "N/A"
+    sort_key = "9999-12-31"
+
+    is_released = False
+    status = "En cours"
+
+    if release_str:
+        try:
+            rd = datetime.strptime(release_str, "%Y-%m-%d").date()
+            release_display = format_date_long_fr(rd)
+            sort_key = release_str
+            if rd <= today:
+                is_released = True
+                status = "Sortie"
+            else:
+                days_to_release = (rd - today).days
+                if days_to_release > 40:
+                    status = "Programmé"
+                else:
+                    status = "En cours"
+        except ValueError:
+            release_display = release_str
+            sort_key = release_str
+
+    return {
+        "slug": slug,
+        "title": data.get("title") or slug,
+        "artist": data.get("artist") or "AngryTode",
+        "label": data.get("label") or "Indépendant",
+        "release_date": release_display,
+        "genre": data.get("genre") or "N/A",
+        "is_released": is_released,
+        "is_archived": archived,
+        "status": status,
+        "sort_key": sort_key,
+    }
+
+
 @app.route("/")
 def index():
     projects = []
     today = datetime.now().date()
 
-    if PROJECTS_DIR.exists():
-        for p in PROJECTS_DIR.iterdir():
-            if p.is_dir() and (p / "project.yaml").exists():
-                data = load_yaml(p / "project.yaml")
-                if not isinstance(data, dict):
-                    continue
-                release_str = data.get("release_date")
-                release_display = "N/A"
-                sort_key = "9999-12-31"
-
-                is_released = False
-                status = "En cours"
-
-                if release_str:
-                    try:
-                        rd = datetime.strptime(release_str, "%Y-%m-%d").date()
-                        release_display = format_date_long_fr(rd)
-                        sort_key = release_str
-                        if rd <= today:
-                            is_released = True
-                            status = "Sortie"
-                        else:
-                            days_to_release = (rd - today).days
-                            if days_to_release > 40:
-                                status = "Programmé"
-                            else:
-                                status = "En cours"
-                    except ValueError:
-                        release_display = release_str
-                        sort_key = release_str
-
-                projects.append({
-                    "slug": p.name,
-                    "title": data.get("title", p.name),
-                    "artist": data.get("artist", "AngryTode"),
-                    "label": data.get("label", "Indépendant"),
-                    "release_date": release_display,
-                    "genre": data.get("genre", "N/A"),
-                    "is_released": is_released,
-                    "status": status,
-                    "sort_key": sort_key,
-                })
+    for p in label_agent.iter_project_dirs():
+        data = label_journal.project_meta(p)
+        if not isinstance(data, dict):
+            continue
+        projects.append(project_card(p.name, data, today))
+
+    # Projets archivés : lus depuis l'index, sans décompresser
+    for slug, data in label_archive.load_index().items():
+        projects.append(project_card(slug, data, today, archived=True))
 
     projects.sort(key=lambda x: x["sort_key"])
 
@@ -369,21 +359,26 @@ def index():
         "index.html",
         projects=projects,
         show_intro_tutorial=show_intro_tutorial,
+        error=request.args.get("error"),
     )
 
 @app.route("/project/<slug>")
 def project_detail(slug):
-    root = PROJECTS_DIR / slug
+    root = label_agent.project_dir(slug)
+    if not root.exists() and label_archive.is_archived(slug):
+        root = label_archive.restore(slug)
     project_yaml = root / "project.yaml"
     plan_md = root / "plan.md"
     checklist_md = root / "checklist.md"
     notes_path = root / "notes.txt"
 
-    project = load_yaml(project_yaml)
+    project = label_journal.project_meta(root)
     plan_html = plan_md.read_text(encoding="utf-8") if plan_md.exists() else "_Aucun plan.md trouvé_"
-    notes = notes_path.read_text(encoding="utf-8") if notes_path.exists() else ""
+    notes = label_journal.notes_text(root) if root.exists() else ""
 
-    checklist_sections, min_offset, max_offset = parse_checklist_sections(checklist_md, TEMPLATE_FILE)
+    checklist_sections, min_offset, max_offset = parse_checklist_sections(
+        checklist_md, label_plans.project_plan(project)
+    )
 
     next_step, days_left, release_date = get_next_deadline(slug)
     checklist_status = load_checklist_status(checklist_md)
@@ -401,7 +396,7 @@ def project_detail(slug):
 
     if next_step and checklist_sections:
         for section in checklist_sections:
-            if section["title"] == next_step["title"]:
+            if section["id"] == next_step["id"]:
                 next_step = dict(next_step)
                 next_step["tasks"] = [t["text"] for t in section["tasks"]]
                 break
@@ -460,6 +455,10 @@ def project_detail(slug):
         min_offset=min_offset,
         max_offset=max_offset,
         notes=notes,
+        notes_hash=label_journal.notes_hash(notes),
+        master_analysis=label_loudness.load_project_analysis(root),
+        assets=label_assets.validate_project(root) if root.exists() else [],
+        asset_rules=label_assets.ASSET_RULES,
         deadline_sections=deadline_sections,
         show_intro_tutorial=False,
         tab_help_state=tab_help_state,
@@ -491,15 +490,18 @@ def tab_help_seen():
 @app.route("/project/<slug>/delete", methods=["POST"])
 def delete_project(slug):
     import shutil
-    project_path = PROJECTS_DIR / slug
+    project_path = label_agent.project_dir(slug)
+    label_journal.forget(project_path)
     if project_path.exists():
+        label_store.release_project(project_path)
         shutil.rmtree(project_path)
+        label_agent.touch_catalog(slug)
+    label_agent.forget_project_dir(slug)
+    label_archive.delete_archived(slug)
     return redirect(url_for("index"))
 
 @app.route("/new_project", methods=["POST"])
 def new_project():
-    from traceback import print_exc
-
     try:
         title = request.form.get("title", "").strip()
         style = request.form.get("style", "").strip()
@@ -509,10 +511,15 @@ def new_project():
         release_type = request.form.get("release_type", "Single").strip() or "Single" 
         use_spotify_canvas = bool(request.form.get("use_spotify_canvas"))
         use_paid_ads = bool(request.form.get("use_paid_ads"))
+        tracks = [t.strip() for t in request.form.get("tracks", "").splitlines() if t.strip()]
 
         if not title or not release_str:
             return redirect(url_for("index"))
 
+        duplicates = label_agent.duplicate_tracks(tracks)
+        if duplicates:
+            return redirect(url_for("index", error="duplicate-tracks", tracks=", ".join(duplicates)))
+
         try:
             release_date = datetime.strptime(release_str, "%Y-%m-%d")
         except ValueError:
@@ -530,20 +537,13 @@ def new_project():
             use_spotify_canvas=use_spotify_canvas,
             use_paid_ads=use_paid_ads,
             release_type=release_type,
+            tracks=tracks,
         )
 
         return redirect(url_for("index"))
 
-    except Exception as e:
-        try:
-            PROJECTS_DIR.mkdir(exist_ok=True)
-            log_path = PROJECTS_DIR / "logfile.log"
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(f"\n[{datetime.now().isoformat()}] Erreur new_project:\n{repr(e)}\n")
-                print_exc(file=f)
-        except Exception:
-            pass
-
+    except Exception:
+        log.exception("Erreur new_project", extra={"title": request.form.get("title", "")})
         return redirect(url_for("index"))
 
 
@@ -555,38 +555,216 @@ def toggle_deadline_task(slug):
     if not task_text:
         return jsonify(success=False, error="no-task-text"), 400
 
-    root = PROJECTS_DIR / slug
+    root = label_agent.project_dir(slug)
     checklist_path = root / "checklist.md"
 
     new_done = None
-
     if checklist_path.exists():
-        lines = checklist_path.read_text(encoding="utf-8").splitlines()
-        new_lines = []
-        for line in lines:
-            stripped = line.strip()
-            if (stripped.startswith("- [ ]") or stripped.startswith("- [x]")) and stripped[5:].strip() == task_text:
-                if stripped.startswith("- [ ]"):
-                    line = line.replace("- [ ]", "- [x]", 1)
-                    new_done = True
-                else:
-                    line = line.replace("- [x]", "- [ ]", 1)
-                    new_done = False
-            new_lines.append(line)
-        checklist_path.write_text("\n".join(new_lines), encoding="utf-8")
+        new_done = label_journal.toggle_task(root, task_text)
 
     if new_done is None:
         return jsonify(success=False, error="task-not-found"), 404
 
-    updated_text = checklist_path.read_text(encoding="utf-8") if checklist_path.exists() else ""
+    updated_text = label_journal.checklist_text(root)
     return jsonify(success=True, done=new_done, checklist=updated_text)
 
 
 @app.route("/project/<slug>/notes", methods=["POST"])
 def update_notes(slug):
     notes = request.form.get("notes", "")
-    root = PROJECTS_DIR / slug
-    root.mkdir(exist_ok=True)
-    notes_path = root / "notes.txt"
-    notes_path.write_text(notes, encoding="utf-8")
-    return redirect(url_for("project_detail", slug=slug) + "#overview-tab-pane")
\ No newline at end of file
+    root = label_agent.project_dir(slug)
+    root.mkdir(parents=True, exist_ok=True)
+    label_journal.write_notes(root, notes)
+    return redirect(url_for("project_detail", slug=slug) + "#overview-tab-pane")
+
+
+@app.route("/project/<slug>/notes/autosave", methods=["POST"])
+def autosave_notes(slug):
+    """
+    Sauvegarde automatique des notes (JSON), sans rechargement de page.
+
+    Corps accepté :
+      {"text": "...", "hash": "..."}                       texte complet
+      {"base": "...", "start": 3, "end": 5, "text": "...",  delta appliqué
+       "hash": "..."}                                       sur la version `base`
+
+    `hash` / `base` sont des sha256 du texte, `start` / `end` des positions
+    en points de code, le tout sur le texte aux fins de ligne LF (celui du
+    textarea côté navigateur). Réponse 204 si accepté
+    (ou inchangé), 409 avec le texte courant si le client est désynchronisé.
+    """
+    root = label_agent.project_dir(slug)
+    if not (root / "project.yaml").exists():
+        return jsonify(success=False, error="project-not-found"), 404
+
+    data = request.get_json(silent=True) or {}
+    current = label_journal.notes_text(root)
+    current_hash = label_journal.notes_hash(current)
+    expected_hash = data.get("hash")
+
+    if expected_hash and expected_hash == current_hash:
+        return ("", 204)
+
+    if "start" in data:
+        if data.get("base") != current_hash:
+            return jsonify(success=False, error="stale-base", hash=current_hash, notes=current), 409
+        try:
+            start = int(data["start"])
+            end = int(data.get("end", start))
+        except (TypeError, ValueError):
+            return jsonify(success=False, error="invalid-delta"), 400
+        if not 0 <= start <= end <= len(current):
+            return jsonify(success=False, error="invalid-delta"), 400
+        text = current[:start] + label_journal.normalize_newlines(str(data.get("text", ""))) + current[end:]
+    elif "text" in data:
+        text = label_journal.normalize_newlines(str(data["text"]))
+    else:
+        return jsonify(success=False, error="no-text"), 400
+
+    if expected_hash and label_journal.notes_hash(text) != expected_hash:
+        return jsonify(success=False, error="hash-mismatch", hash=current_hash, notes=current), 409
+
+    try:
+        # `text` a été calculé sur `current` : refusé si une autre sauvegarde
+        # est passée entre-temps (vérifié sous le verrou du journal)
+        label_journal.buffer_notes(root, text, base=current_hash)
+    except label_journal.NotesConflict as e:
+        notes = e.notes
+        return jsonify(success=False, error="stale-base", hash=label_journal.notes_hash(notes), notes=notes), 409
+    return ("", 204)
+
+
+EDITABLE_META_FIELDS = ("title", "artist", "label", "genre", "release_type", "release_date")
+
+
+@app.route("/project/<slug>/meta", methods=["POST"])
+def update_meta(slug):
+    root = label_agent.project_dir(slug)
+    if not (root / "project.yaml").exists():
+        return jsonify(success=False, error="project-not-found"), 404
+
+    data = request.get_json(silent=True) or {}
+    fields = {}
+    for key in EDITABLE_META_FIELDS:
+        if key not in data:
+            continue
+        value = str(data[key]).strip()
+        if key == "release_date":
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                return jsonify(success=False, error="invalid-release-date"), 400
+        fields[key] = value
+
+    changes = label_journal.edit_meta(root, fields)
+    return jsonify(success=True, changes=changes)
+
+
+@app.route("/project/<slug>/undo", methods=["POST"])
+@app.route("/project/<slug>/redo", methods=["POST"])
+def undo_redo(slug):
+    root = label_agent.project_dir(slug)
+    if not (root / "project.yaml").exists():
+        return jsonify(success=False, error="project-not-found"), 404
+
+    if request.path.endswith("/undo"):
+        event = label_journal.undo(root)
+    else:
+        event = label_journal.redo(root)
+
+    if event is None:
+        return jsonify(success=False, error="nothing-to-do"), 409
+    return jsonify(success=True, event=event["type"])
+
+
+@app.route("/project/<slug>/history")
+def task_history(slug):
+    root = label_agent.project_dir(slug)
+    if not (root / "project.yaml").exists():
+        return jsonify(success=False, error="project-not-found"), 404
+    return jsonify(success=True, history=label_journal.task_history(root))
+
+
+@app.route("/project/<slug>/master", methods=["POST"])
+def upload_master(slug):
+    root = label_agent.project_dir(slug)
+    if not (root / "project.yaml").exists():
+        return redirect(url_for("index"))
+
+    upload = request.files.get("master")
+    if upload and upload.filename:
+        label_store.add_to_project(root, label_loudness.MASTER_FILE, upload.stream)
+        label_assets.validate_project(root, tick=True)
+        # plusieurs secondes pour un titre entier : hors du thread de la requête
+        label_loudness.analyze_in_background(root)
+
+    return redirect(url_for("project_detail", slug=slug) + "#overview-tab-pane")
+
+
+@app.route("/project/<slug>/master/analysis")
+def master_analysis(slug):
+    """Résultat de l'analyse du master (interrogé par la page tant qu'il est en attente)."""
+    root = label_agent.project_dir(slug)
+    if not (root / "project.yaml").exists():
+        return jsonify(success=False, error="project-not-found"), 404
+    return jsonify(success=True, analysis=label_loudness.load_project_analysis(root))
+
+
+@app.route("/project/<slug>/assets", methods=["POST"])
+def upload_assets(slug):
+    root = label_agent.project_dir(slug)
+    if not (root / "project.yaml").exists():
+        return redirect(url_for("index"))
+
+    for upload in request.files.getlist("assets"):
+        name = secure_filename(upload.filename or "")
+        if name:
+            label_store.add_to_project(root, f"{label_assets.ASSETS_DIRNAME}/{name}", upload.stream)
+
+    label_assets.validate_project(root, tick=True)
+    return redirect(url_for("project_detail", slug=slug) + "#overview-tab-pane")
+
+
+@app.route("/project/<slug>/assets/<name>", methods=["PUT"])
+def put_asset(slug, name):
+    """
+    Envoi d'un fichier en flux brut (corps de la requête, éventuellement
+    en Transfer-Encoding: chunked) : hashé et écrit au fil de la réception.
+    """
+    root = label_agent.project_dir(slug)
+    if not (root / "project.yaml").exists():
+        return jsonify(success=False, error="project-not-found"), 404
+
+    name = secure_filename(name)
+    if not name:
+        return jsonify(success=False, error="invalid-name"), 400
+
+    rel_path = f"{label_assets.ASSETS_DIRNAME}/{name}"
+    digest, size = label_store.add_to_project(root, rel_path, request.stream)
+    result = label_assets.validate_file(root / rel_path, content_hash=digest)
+    if result["rule"]:
+        # tous les fichiers du projet : le nombre de masters valides borne
+        # les tâches [per_track] cochées
+        label_assets.validate_project(root, tick=True)
+    return jsonify(success=True, sha256=digest, size=size, validation=result)
+
+
+def _export_response(chunks, mimetype, filename):
+    etag = label_export.catalog_etag()
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+@app.route("/export/calendar.ics")
+def export_calendar():
+    return _export_response(label_export.iter_ics(), "text/calendar", "pulse-deadlines.ics")
+
+
+@app.route("/export/deadlines.csv")
+def export_deadlines_csv():
+    return _export_response(label_export.iter_csv(), "text/csv", "pulse-deadlines.csv")
@@ -4,19 +4,13 @@ import atexit
 import sys
 from pathlib import Path
 from label_ui import app, PROJECTS_DIR
+import label_journal
+import label_logging
+import label_scheduler
 
 
-# Chemin du fichier de log
-ERROR_LOG = PROJECTS_DIR / "_pulse_error.log"
-
-def clear_error_log():
-    try:
-        if ERROR_LOG.exists():
-            ERROR_LOG.write_text("", encoding="utf-8")
-    except Exception:
-        pass
-
-atexit.register(clear_error_log)
+# Réécrit checklist.md / notes.txt / project.yaml depuis les journaux en attente
+atexit.register(label_journal.compact_all)
 
 if getattr(sys, "frozen", False):
     BASE_DIR = Path(sys.executable).parent
@@ -30,6 +24,12 @@ def start_flask():
     app.run(host="127.0.0.1", port=5000, debug=True, use_reloader=False)
 
 if __name__ == "__main__":
+    # Logs JSON en tâche de fond (pulse.log / _pulse_error.log, avec rotation)
+    label_logging.setup(PROJECTS_DIR)
+    label_journal.start_compactor()
+    # Rappels des deadlines (notification + _reminders.md)
+    label_scheduler.start()
+
     t = threading.Thread(target=start_flask, daemon=True)
     t.start()
 